@@ -24,4 +24,10 @@ bl_info = {
     "wiki_url": "http://wiki.blender.org/index.php/Extensions:2.6/Py/Scripts/UV/Uv_Squares"
 }
 
-from .uv_squares import *
+try:
+    import bpy
+except ImportError:
+    #imported outside of blender, only uv_squares_core is usable (e.g. by island worker processes)
+    pass
+else:
+    from .uv_squares import *
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import uv_squares_core as core
+
+def MakeMesh(faces, uv, co = None, seams = (), selected = None, activeFace = -1):
+    """UvMesh of faces given as lists of vertex indices, uv is one (x, y) per vertex.
+
+    Edges are made from the faces, seams are (vertex, vertex) pairs. selected holds the
+    selected faces, all of them when None. Loops are selected with their faces.
+    """
+    faceTotal = [len(f) for f in faces]
+    faceStart = np.concatenate(([0], np.cumsum(faceTotal)[:-1])).astype(np.int64)
+    loopVert = np.concatenate(faces).astype(np.int64)
+
+    loopNext = np.arange(1, len(loopVert) + 1)
+    loopNext[faceStart + np.array(faceTotal) - 1] = faceStart
+    pairs = np.sort(np.stack((loopVert, loopVert[loopNext]), axis=1), axis=1)
+    edgeVerts, loopEdge = np.unique(pairs, axis=0, return_inverse=True)
+    seams = set(tuple(sorted(s)) for s in seams)
+    edgeSeam = [tuple(e) in seams for e in edgeVerts.tolist()]
+
+    uv = np.asarray(uv, dtype=np.float64)
+    if co is None: co = np.concatenate((uv, np.zeros((len(uv), 1))), axis=1)
+    faceSelect = np.ones(len(faces), dtype=bool)
+    if selected is not None:
+        faceSelect[:] = False
+        faceSelect[list(selected)] = True
+
+    topology = core.MeshTopology(faceStart, faceTotal, loopVert, loopEdge.ravel(), edgeVerts)
+    return core.UvMesh(uv[loopVert], np.repeat(faceSelect, faceTotal), np.ones(len(faces), dtype=bool),
+                       edgeSeam, co, topology, activeFace)
+
+def GridFaces(nx, ny):
+    #quads of a (nx+1)*(ny+1) vertex grid, vertex (i, j) is j*(nx+1) + i and sits at uv (i, j)/10
+    faces = [[j*(nx + 1) + i, j*(nx + 1) + i + 1, (j + 1)*(nx + 1) + i + 1, (j + 1)*(nx + 1) + i]
+             for j in range(ny) for i in range(nx)]
+    uv = [(i/10, j/10) for j in range(ny + 1) for i in range(nx + 1)]
+    return faces, uv
+
+@pytest.fixture
+def grid():
+    def Grid(nx, ny, **kwargs):
+        faces, uv = GridFaces(nx, ny)
+        return MakeMesh(faces, uv, **kwargs)
+    return Grid
+
+@pytest.fixture
+def make_mesh():
+    return MakeMesh
@@ -0,0 +1,381 @@
+import os
+
+import numpy as np
+import pytest
+
+import uv_squares_core as core
+from conftest import GridFaces
+
+def Groups(labels):
+    #labels as a set of frozensets of the indices sharing a label
+    groups = {}
+    for i, label in enumerate(np.asarray(labels).tolist()):
+        groups.setdefault(label, set()).add(i)
+    return set(frozenset(g) for g in groups.values())
+
+def test_connected_components():
+    labels = core.ConnectedComponents(7, np.array([0, 1, 4, 6]), np.array([1, 2, 5, 4]))
+    assert Groups(labels) == {frozenset({0, 1, 2}), frozenset({3}), frozenset({4, 5, 6})}
+
+def test_connected_components_without_pairs():
+    labels = core.ConnectedComponents(3, np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+    assert Groups(labels) == {frozenset({0}), frozenset({1}), frozenset({2})}
+
+def test_connected_components_long_chain():
+    #pointer jumping has to follow a chain given in the worst order
+    n = 1000
+    labels = core.ConnectedComponents(n, np.arange(n - 1)[::-1], np.arange(1, n)[::-1])
+    assert len(set(labels.tolist())) == 1
+
+def test_uv_verts_groups_loops_of_one_uv_vertex(grid):
+    mesh = grid(2, 1)
+    uvVerts = core.UvVerts(mesh.uv, mesh.loopVert, np.arange(len(mesh.uv)))
+    assert len(uvVerts) == 6
+    #the two middle verts are used by both quads
+    assert sorted(uvVerts.group(1).tolist()) == [1, 4]
+    assert sorted(uvVerts.group(2).tolist()) == [2, 7]
+
+def test_uv_verts_find(grid):
+    mesh = grid(2, 1)
+    uvVerts = core.UvVerts(mesh.uv, mesh.loopVert, np.arange(4))
+    groups = uvVerts.find(mesh.uv, mesh.loopVert, np.arange(len(mesh.uv)))
+    #loops of the second quad are found through the verts they share with the first one
+    assert (groups[:4] >= 0).all()
+    assert groups[4] == groups[1] and groups[7] == groups[2]
+    assert groups[5] == -1 and groups[6] == -1
+
+    #groups keep the uvs they were built with, a moved loop isn't found any more
+    uv = mesh.uv.copy()
+    uv[4] += 0.5
+    assert uvVerts.find(uv, mesh.loopVert, [4])[0] == -1
+
+def test_uv_verts_split_by_uv(grid):
+    #a vertex with another uv in the second quad, as on a seam, makes two groups
+    mesh = grid(2, 1)
+    mesh.uv[4] += 0.5
+    uvVerts = core.UvVerts(mesh.uv, mesh.loopVert, np.arange(len(mesh.uv)))
+    assert len(uvVerts) == 7
+    assert uvVerts.loopGroup[1] != uvVerts.loopGroup[4]
+    assert uvVerts.loopGroup[2] == uvVerts.loopGroup[7]
+
+def test_uv_verts_move(grid):
+    mesh = grid(2, 1)
+    uvVerts = core.UvVerts(mesh.uv, mesh.loopVert, np.arange(len(mesh.uv)))
+    uvVerts.move(mesh.uv, 1, (5, 6))
+    assert mesh.uv[1].tolist() == [5, 6] and mesh.uv[4].tolist() == [5, 6]
+
+def test_quasi_unique_verts_keeps_first_of_each_group():
+    uv = np.array([(0.1, 0.1), (0.2, 0.2), (0.1 + 4e-6, 0.1 - 4e-6), (0.3, 0.3), (0.2, 0.2)])
+    assert core.QuasiUniqueVerts(uv, [0, 1, 2, 3, 4]) == [0, 1, 3]
+    assert core.QuasiUniqueVerts(uv, [4, 3, 2, 1, 0]) == [4, 3, 2]
+
+def test_quasi_unique_verts_across_cells():
+    #quasi equal verts on both sides of a cell border are still one vert
+    e = 0.00001
+    uv = np.array([(e - 1e-7, 0.0), (e + 1e-7, 0.0), (3*e, 0.0)])
+    assert core.QuasiUniqueVerts(uv, [0, 1, 2]) == [0, 2]
+
+def test_lattice_coordinates_of_grid(grid):
+    nx, ny = 4, 3
+    mesh = grid(nx, ny)
+    lattice, reached = core.LatticeCoordinates(mesh, 0, range(nx*ny))
+    assert reached.all()
+    #every loop gets the grid position of its vertex
+    i = mesh.loopVert % (nx + 1)
+    j = mesh.loopVert // (nx + 1)
+    assert (lattice == np.stack((i, j), axis=1)).all()
+
+def test_lattice_coordinates_stop_at_seams(grid):
+    mesh = grid(2, 1, seams=[(1, 4)])
+    lattice, reached = core.LatticeCoordinates(mesh, 0, range(2))
+    assert reached.tolist() == [True, False]
+
+def test_lattice_coordinates_reject_non_quads(make_mesh):
+    faces = [[0, 1, 4, 3], [1, 2, 5, 4], [3, 4, 7, 8, 6]]
+    uv = [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1), (0, 2), (1, 2.5), (2, 2)]
+    mesh = make_mesh(faces, uv)
+    assert core.LatticeCoordinates(mesh, 0, range(3)) is None
+    assert core.LatticeCoordinates(mesh, 0, range(2)) is not None
+
+def test_lattice_coordinates_reject_flipped_neighbours(make_mesh):
+    #second quad wound the other way
+    faces = [[0, 1, 4, 3], [1, 4, 5, 2]]
+    uv = [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1)]
+    assert core.LatticeCoordinates(make_mesh(faces, uv), 0, range(2)) is None
+
+def test_lattice_uv_matches_face_walk(grid):
+    rng = np.random.default_rng(7)
+    nx, ny = 8, 6
+    compared = {'EVEN': 0, 'LENGTH_AVERAGE': 0}
+    for attempt in range(20):
+        #uneven 3d edges so the rings average to different lengths
+        co = np.concatenate((rng.uniform(0, 1, ((nx + 1)*(ny + 1), 2)), np.zeros(((nx + 1)*(ny + 1), 1))), axis=1)
+        co[:, 0] += np.arange((nx + 1)*(ny + 1)) % (nx + 1)
+        co[:, 1] += np.arange((nx + 1)*(ny + 1)) // (nx + 1)
+        seams = [(v, v + nx + 1) for v in rng.choice(nx*ny, 4, replace=False) if v % (nx + 1) != 0]
+        selected = np.flatnonzero(rng.random(nx*ny) < 0.7)
+        mesh = grid(nx, ny, co=co, seams=seams, selected=selected)
+        for island, loops in core.DetachIslands(mesh, selected):
+            faces = range(len(island.faceStart))
+            uvVerts = core.UvVerts(island.uv, island.loopVert, np.arange(len(island.uv)))
+            core.ShapeFace(island, island.activeFace, uvVerts, [], False)
+            for mode in ('EVEN', 'LENGTH_AVERAGE'):
+                edgeLengths = core.EdgeRingLengths(island, faces)
+                walked = core.DetachFaces(island, faces, island.activeFace)[0]
+                core.FollowActiveUV(walked, walked.activeFace, faces, mode, edgeLengths)
+                placed = core.DetachFaces(island, faces, island.activeFace)[0]
+                #lines split into rings of other lengths are left to the walk
+                if not core.LatticeUV(placed, placed.activeFace, faces, mode, edgeLengths):
+                    assert (placed.uv == island.uv).all()
+                    continue
+                assert np.allclose(placed.uv, walked.uv, rtol=0, atol=1e-9)
+                compared[mode] += 1
+    assert min(compared.values()) > 20
+
+def test_edge_ring_lengths(make_mesh):
+    #two quads side by side, the ring across them has a 1 and a 3 long edge
+    faces = [[0, 1, 4, 3], [1, 2, 5, 4]]
+    uv = [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1)]
+    co = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (0, 1, 0), (1, 3, 0), (2, 1, 0)]
+    mesh = make_mesh(faces, uv, co=co)
+    lengths = core.EdgeRingLengths(mesh, range(2))
+    edges = {tuple(e): lengths[i] for i, e in enumerate(mesh.edgeVerts.tolist())}
+    assert edges[(0, 3)] == edges[(1, 4)] == edges[(2, 5)] == pytest.approx(5/3)
+    assert edges[(0, 1)] == edges[(3, 4)] == pytest.approx((1 + 5**0.5)/2)
+    assert edges[(1, 2)] == edges[(4, 5)] == pytest.approx((1 + 5**0.5)/2)
+    #faces left out don't carry a ring
+    lengths = core.EdgeRingLengths(mesh, [0])
+    assert np.isnan(lengths[mesh.edgeVerts.tolist().index([2, 5])])
+    assert lengths[mesh.edgeVerts.tolist().index([1, 4])] == pytest.approx(2)
+
+def test_island_ids(grid):
+    #3x1 quads, the seam cuts the last one off and the middle one is left out
+    mesh = grid(3, 1, seams=[(2, 6)])
+    ids = core.IslandIds(mesh, [True, True, True])
+    assert ids[0] == ids[1] != ids[2]
+    assert core.IslandIds(mesh, [True, False, True]).tolist() == [0, -1, 1]
+    assert core.IslandIds(mesh, [False]*3).tolist() == [-1]*3
+
+def test_kdtree_built_on_second_query():
+    rng = np.random.default_rng(3)
+    uv = rng.random((500, 2))
+    verts = np.arange(0, 500, 2)
+    tree = core.UvKDTree(uv, verts, useMathutils=False)
+    for points in ([(0.5, 0.5)], [(0.1, 0.9), (1.2, -0.1)], rng.random((5, 2)).tolist()):
+        assert tree.closest(points) == core.ClosestTo(uv, list(verts), points)
+    #scanned once, then built
+    assert tree.nodes is not None and tree.queries == 3
+
+def test_rip_faces_deselects_loops_of_unselected_faces(grid):
+    mesh = grid(2, 1, selected=[0])
+    #selected in the editor, the shared verts are selected in the other quad too
+    mesh.loopSelect[[4, 7]] = True
+    core.RipUvFaces(mesh)
+    assert mesh.loopSelect.tolist() == [True]*4 + [False]*4
+
+def test_rip_vertex_keeps_first_loop(grid):
+    mesh = grid(2, 1, selected=[])
+    mesh.loopSelect[[1, 4]] = True
+    core.RipUvFaces(mesh)
+    assert np.flatnonzero(mesh.loopSelect).tolist() == [1]
+
+def test_join_snaps_to_closest_unselected(grid):
+    mesh = grid(2, 1, selected=[1])
+    before = mesh.uv.copy()
+    mesh.uv[4:8] += 0.004
+    radius = core.JoinUvFaces(mesh, 0.01)
+    assert radius == 0.01
+    #the shared verts go back onto the first quad, the others have nothing close enough
+    assert np.array_equal(mesh.uv[[4, 7]], before[[1, 2]])
+    assert np.array_equal(mesh.uv[[5, 6]], before[[5, 6]] + 0.004)
+    assert mesh.loopSelect[[1, 2]].all() and not mesh.loopSelect[[0, 3]].any()
+
+def test_join_selects_the_loops_it_passed_over(grid):
+    mesh = grid(2, 1, selected=[1])
+    before = mesh.uv.copy()
+    mesh.uv[4:8] += 0.004
+    #farther than the shared vert but within the radius, loop 0 comes before it and loop 3 after
+    mesh.uv[0] = before[1] + (0.004, 0.012)
+    mesh.uv[3] = before[2] + (0.004, 0.012)
+    core.JoinUvFaces(mesh, 0.01)
+    assert np.array_equal(mesh.uv[[4, 7]], before[[1, 2]])
+    #as the scan in loop order did, loop 0 was the closest for a while
+    assert mesh.loopSelect[[0, 1, 2]].all() and not mesh.loopSelect[3]
+
+def test_join_matches_scan_of_every_loop(grid):
+    rng = np.random.default_rng(5)
+    for attempt in range(10):
+        mesh = grid(8, 8, selected=[])
+        mesh.uv += rng.normal(0, 0.02, mesh.uv.shape)
+        mesh.loopSelect[:] = rng.random(len(mesh.uv)) < 0.4
+        expectedUv = mesh.uv.copy()
+        expectedSelect = mesh.loopSelect.copy()
+        #the addon's scan: per vert in the order of its first loop, over every loop of the mesh
+        uvVerts = core.UvVerts(mesh.uv, mesh.loopVert, np.flatnonzero(mesh.loopSelect))
+        firstLoops = uvVerts.groupLoops[uvVerts.groupStart[:-1]]
+        for g in np.argsort(firstLoops, kind='stable'):
+            loops = uvVerts.groupLoops[uvVerts.groupStart[g]:uvVerts.groupStart[g + 1]]
+            minDistance, minV = 1, None
+            for l in range(len(mesh.uv)):
+                if expectedSelect[l]: continue
+                distance = np.hypot(*(expectedUv[loops[0]] - expectedUv[l]))
+                if distance <= minDistance and distance < 0.05:
+                    minDistance, minV = distance, l
+                    expectedSelect[l] = True
+            if minV is not None: expectedUv[loops] = expectedUv[minV]
+
+        core.JoinUvFaces(mesh, 0.05)
+        assert np.array_equal(mesh.uv, expectedUv)
+        assert np.array_equal(mesh.loopSelect, expectedSelect)
+
+def test_join_outside_of_radius(grid):
+    mesh = grid(2, 1, selected=[1])
+    mesh.uv[4:8] += 0.004
+    moved = mesh.uv.copy()
+    core.JoinUvFaces(mesh, 0.002)
+    assert np.array_equal(mesh.uv, moved)
+
+def test_join_zero_radius(grid):
+    mesh = grid(2, 1, selected=[1])
+    mesh.uv[4:8] += 0.004
+    moved = mesh.uv.copy()
+    assert core.JoinUvFaces(mesh, 0.0) == 0.0
+    assert np.array_equal(mesh.uv, moved)
+
+def test_join_automatic_radius(grid):
+    mesh = grid(2, 1, selected=[1])
+    mesh.uv[4:8] += 0.004
+    #a quarter of the median selected edge, every edge is 0.1 long
+    assert abs(core.JoinUvFaces(mesh) - 0.025) < 1e-12
+    assert np.allclose(mesh.uv[[4, 7]], mesh.uv[[1, 2]])
+
+class Editor:
+    def __init__(self, cursors):
+        self.cursors = list(cursors)
+
+    def setCursors(self, x, y):
+        self.cursors = [(x, y)]*len(self.cursors)
+
+def test_reshape_single_vert_snaps_cursor(grid):
+    mesh = grid(2, 1, selected=[])
+    mesh.loopSelect[[2, 7]] = True
+    editor = Editor([(0.0, 0.0)])
+    before = mesh.uv.copy()
+    core.Reshape([mesh], editor)
+    assert editor.cursors == [(0.1, 0.1)]
+    assert np.array_equal(mesh.uv, before)
+
+def test_reshape_line_to_axis(grid):
+    mesh = grid(3, 1, selected=[])
+    bottom = mesh.loopVert <= 3
+    mesh.loopSelect[bottom] = True
+    mesh.uv[bottom, 1] += 0.02*mesh.loopVert[bottom]
+    editor = Editor([(0.0, 0.0)])
+    core.Reshape([mesh], editor)
+    #the line is scaled to 0 around the vert closest to the cursor, which the cursor snaps to
+    assert np.allclose(mesh.uv[bottom, 1], 0.0)
+    assert editor.cursors == [(0.0, 0.0)]
+
+def test_reshape_grid_of_squares(grid):
+    mesh = grid(3, 2)
+    rng = np.random.default_rng(0)
+    mesh.uv += rng.normal(0, 0.01, (len(mesh.vertCo), 2))[mesh.loopVert]
+    core.Reshape([mesh], Editor([(0.0, 0.0)]), square=True)
+    #every quad is a square of the same size, with edges along the axes
+    quads = mesh.uv.reshape(-1, 4, 2)
+    edges = np.roll(quads, -1, axis=1) - quads
+    lengths = np.abs(edges).max(axis=2)
+    assert np.allclose(np.abs(edges).min(axis=2), 0.0)
+    assert np.allclose(lengths, lengths[0, 0])
+
+def test_grid_meshes_sends_islands_in_chunks(grid):
+    class Executor:
+        def map(self, function, *iterables, chunksize = 1):
+            self.chunksize = chunksize
+            return map(function, *iterables)
+    executor = Executor()
+    sizes = []
+    #four islands of 1, 1, 2 and 2 quads
+    mesh = grid(6, 1, seams=[(1, 8), (2, 9), (4, 11)])
+    serial = grid(6, 1, seams=[(1, 8), (2, 9), (4, 11)])
+    core.GridMeshes([(mesh, range(6), ())], [], True, executorFor=lambda islandFaces: sizes.extend(islandFaces) or executor)
+    core.GridMeshes([(serial, range(6), ())], [], True)
+    assert sorted(sizes) == [1, 1, 2, 2]
+    assert executor.chunksize == core.IslandChunkSize(4, os.cpu_count() or 1)
+    assert (mesh.uv == serial.uv).all()
+    assert core.IslandChunkSize(5000, 2) == 625 and core.IslandChunkSize(3, 4) == 1
+
+def test_reshape_keep_non_quads(make_mesh):
+    #a triangle on top of the first of two quads
+    faces = [[0, 1, 4, 3], [1, 2, 5, 4], [3, 4, 6]]
+    uv = [(0, 0), (0.1, 0.01), (0.2, 0), (0, 0.1), (0.12, 0.1), (0.2, 0.11), (0.05, 0.2)]
+    kept = make_mesh(faces, uv)
+    before = kept.uv.copy()
+    core.Reshape([kept], Editor([(0.0, 0.0)]), square=True, keepNonQuads=True)
+    #the verts the triangle shares with the grid follow it, its tip moves as they do on average
+    assert np.array_equal(kept.uv[[8, 9]], kept.uv[[3, 2]])
+    tip = before[10] + (kept.uv[[8, 9]] - before[[8, 9]]).mean(axis=0)
+    assert np.allclose(kept.uv[10], tip)
+    assert kept.loopSelect[8:].all()
+
+    #without it the triangle is deselected, only the loops on the grid's edge are connected back
+    left = make_mesh(faces, uv)
+    core.Reshape([left], Editor([(0.0, 0.0)]), square=True)
+    assert np.array_equal(left.uv[:10], kept.uv[:10])
+    assert np.array_equal(left.uv[10], before[10])
+    assert not left.loopSelect[10]
+
+def test_reshape_keep_non_quads_joins_pieces(make_mesh):
+    #6x3 quads with their third column triangulated, the quads on both sides of it are one island
+    faces, uv = GridFaces(6, 3)
+    quads = [f for k, f in enumerate(faces) if k % 6 != 2]
+    triangles = [t for k, f in enumerate(faces) if k % 6 == 2 for t in ([f[0], f[1], f[2]], [f[0], f[2], f[3]])]
+    rng = np.random.default_rng(4)
+    uv = np.array(uv) + rng.normal(0, 0.01, (len(uv), 2))
+    assert len(core.DetachIslands(make_mesh(quads + triangles, uv), range(len(quads)), range(len(quads), len(quads) + len(triangles)))) == 1
+
+    for square in (True, False):
+        mesh = make_mesh(quads + triangles, uv)
+        core.Reshape([mesh], Editor([(0.0, 0.0)]), square=square, keepNonQuads=True)
+        corners = mesh.uv[:4*len(quads)]
+        #all quad corners on one lattice, the triangles taking up one column of it
+        xs = np.unique(np.round(corners[:, 0], 9))
+        ys = np.unique(np.round(corners[:, 1], 9))
+        assert len(xs) == 7 and len(ys) == 4
+        if square:
+            assert np.allclose(np.diff(xs), xs[1] - xs[0]) and np.allclose(np.diff(ys), xs[1] - xs[0])
+
+def test_relax_non_quads_solves_for_the_average(make_mesh):
+    #16x16 quads with a triangulated 10x10 block in the middle, its inner verts are free
+    nx = 16
+    faces, uv = GridFaces(nx, nx)
+    triangles = []
+    for k, f in enumerate(faces):
+        if 3 <= k % nx < 13 and 3 <= k // nx < 13:
+            triangles += [[f[0], f[1], f[2]], [f[0], f[2], f[3]]]
+    quads = [f for k, f in enumerate(faces) if not (3 <= k % nx < 13 and 3 <= k // nx < 13)]
+    rng = np.random.default_rng(2)
+    uv = np.array(uv) + rng.normal(0, 0.01, (len(uv), 2))
+    mesh = make_mesh(quads + triangles, uv)
+    before = mesh.uv.copy()
+    core.Reshape([mesh], Editor([(0.0, 0.0)]), square=True, keepNonQuads=True)
+
+    #every inner vert of the block moved by the average move of its neighbours, edges of two triangles counting twice
+    move = np.zeros((len(uv), 2))
+    move[mesh.loopVert] = mesh.uv - before
+    loops = core.FacesLoops(mesh, range(len(quads), len(quads) + len(triangles)))
+    a = mesh.loopVert[loops]
+    b = mesh.loopVert[mesh.loopNext[loops]]
+    a, b = np.concatenate((a, b)), np.concatenate((b, a))
+    inner = [j*(nx + 1) + i for j in range(4, 13) for i in range(4, 13)]
+    count = np.bincount(a, minlength=len(uv))[inner]
+    total = np.stack([np.bincount(a, weights=move[b, k], minlength=len(uv))[inner] for k in (0, 1)], axis=1)
+    assert np.abs(move[inner] - total/count[:, None]).max() < 1e-9
+    assert np.abs(move[inner]).max() > 0.01
+
+def test_even_sample_count():
+    for count in range(1, 40):
+        sample = core.EvenSample(np.arange(count), 8)
+        assert len(sample) == count if count <= 8 else 5 <= len(sample) <= 8
+    #one short of two whole steps used to give every item
+    assert len(core.EvenSample(np.arange(8191), 4096)) == 4096
@@ -26,132 +26,244 @@ bl_info = {
 
 import bpy
 import bmesh
-from collections import defaultdict
-from math import radians, hypot
+import gpu
+from gpu_extras.batch import batch_for_shader
+import os
+import json
+import cProfile
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from math import radians
 from timeit import default_timer as timer
 
-precision = 3
+try:
+    from . import uv_squares_core as core
+except ImportError:
+    import uv_squares_core as core
+
+#islands are reshaped in this process unless this many faces can be shared between the workers,
+#sending them would cost more
+parallelFaceCount = 20000
+#when at least this many loops and a fifth of the mesh changed, the edit mesh is rebuilt instead of written loop by loop
+rebuildLoopCount = 10000
+islandPool = None
+#2d cursors the operators see without an UV Editor, in background mode; scripts set them and the operators move them
+backgroundCursors = []
+#(operator label, elapsed seconds, Stages) of the last run, shown in the panel
+lastRun = None
 
-#todo: make joining radius scale with editor zoom rate or average unit length
 #todo: align to axis by respect to vert distance
-#todo: snap 2dCursor to closest selected vert (when more vertices are selected
 #todo: rip different vertex on each press
 
-def main(context, operator, square = False, snapToClosest = False):
+def main(context, operator, square = False, snapToClosest = False, session = None, keepNonQuads = False):
     if context.scene.tool_settings.use_uv_select_sync:
         operator.report({'ERROR'}, "Please disable 'Keep UV and edit mesh in sync'")
         # context.scene.tool_settings.use_uv_select_sync = False
         return
 
+    startTime = timer()
+    #callers running main more than once pass their own session and flush it themselves
+    ownSession = session is None
+    if ownSession: session = UvSession()
+
     selected_objects = context.selected_objects
     if (context.edit_object not in selected_objects):
         selected_objects.append(context.edit_object)
 
-    for obj in selected_objects:
-        if (obj.type == "MESH"):
-            main1(obj, context, operator, square, snapToClosest)
-
-def main1(obj, context, operator, square, snapToClosest):
-    if context.scene.tool_settings.use_uv_select_sync:
-        operator.report({'ERROR'}, "Please disable 'Keep UV and edit mesh in sync'")
-        # context.scene.tool_settings.use_uv_select_sync = False
-        return
+    #editor state is the same for every object
+    editor = EditorSnapshot(context.screen)
+    sizeX, sizeY = editor.imageSize
+
+    #meshes are read one after the other as Reshape gets to them
+    meshes = (session.read(obj) for obj in selected_objects if obj.type == "MESH")
+    core.Reshape(meshes, editor, square, snapToClosest, sizeX/sizeY, keepNonQuads,
+                 IslandExecutor, session.stages)
+
+    if ownSession:
+        session.flush()
+        return SuccessFinished(startTime, operator, session.stages)
+
+class IslandPool:
+    """Spawned worker processes for GridMeshes that fall back to this process when they fail.
+
+    A worker that can't start, can't import the addon or dies breaks the whole pool,
+    so the pool is shut down and dropped, the islands are reshaped with the builtin
+    map and the next big selection starts a new pool.
+    """
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+
+    def map(self, function, *iterables, chunksize = 1):
+        global islandPool
+        iterables = [list(i) for i in iterables]
+        try:
+            return list(self.executor.map(function, *iterables, chunksize=chunksize))
+        except Exception as error:
+            #an error of the function itself is raised again by the builtin map
+            print("UvSquares workers failed, reshaping in this process:", repr(error))
+            if islandPool is self:
+                islandPool = None
+            self.shutdown(wait=False)
+            return list(map(function, *iterables))
+
+    def shutdown(self, wait = True):
+        try:
+            self.executor.shutdown(wait=wait)
+        except Exception:
+            #a broken pool may fail to shut down, its workers are gone anyway
+            pass
+
+def IslandExecutor(islandFaces):
+    global islandPool
+    workers = os.cpu_count() or 1
+    #the biggest island keeps one worker busy on its own, the others need enough islands and faces to share
+    shared = sum(islandFaces) - max(islandFaces)
+    if len(islandFaces) < 2*workers or shared < parallelFaceCount:
+        return None
+    #before 2.91 sys.executable is blender itself, which can't run spawned workers
+    if bpy.app.version < (2, 91, 0) or workers < 2:
+        return None
+    if islandPool is None:
+        islandPool = IslandPool()
+    return islandPool
+
+class UvSession:
+    """Edit meshes read during one operator run.
+
+    Every object is read once, later reads return the same UvMesh. flush writes the
+    loops that changed since the read and updates each changed mesh a single time.
+    Time spent reading and updating goes to stages, next to what the operator adds.
+    """
+    def __init__(self):
+        self.objects = {}
+        self.stages = core.Stages()
+
+    def read(self, obj):
+        entry = self.objects.get(obj)
+        if entry is None:
+            bm = bmesh.from_edit_mesh(obj.data)
+            uv_layer = bm.loops.layers.uv.verify()
+            # bm.faces.layers.tex.verify()  # currently blender needs both layers.
+            with self.stages.time("read"):
+                mesh = ReadUvMesh(obj, bm)
+            self.stages.add("read", 0.0, len(mesh.uv))
+            entry = (mesh, bm, uv_layer, mesh.uv.copy(), mesh.loopSelect.copy())
+            self.objects[obj] = entry
+        return entry[0]
+
+    def flush(self):
+        for obj, (mesh, bm, uv_layer, uv, loopSelect) in self.objects.items():
+            with self.stages.time("mesh update"):
+                changed, rebuilt = WriteUvMesh(mesh, obj, bm, uv_layer, uv, loopSelect)
+                if changed:
+                    bmesh.update_edit_mesh(obj.data, loop_triangles=False, destructive=rebuilt)
+            self.stages.add("mesh update", 0.0, changed)
+        self.objects.clear()
+
+def ReadUvMesh(obj, bm):
+    #edit mode changes are only visible to foreach_get after syncing them to the mesh
+    obj.update_from_editmode()
+
+    activeFace = bm.faces.active
+    if activeFace is not None:
+        bm.faces.index_update()
+
+    activeFace = -1 if activeFace is None else activeFace.index
 
-    startTime = timer()
     me = obj.data
-    bm = bmesh.from_edit_mesh(me)
-    uv_layer = bm.loops.layers.uv.verify()
-    # bm.faces.layers.tex.verify()  # currently blender needs both layers.
-
-    edgeVerts, filteredVerts, selFaces, nonQuadFaces, vertsDict, noEdge = ListsOfVerts(uv_layer, bm)
-    
-    if len(filteredVerts) == 0: return 
-    if len(filteredVerts) == 1: 
-        SnapCursorToClosestSelected(filteredVerts)
-        return 
-    
-    cursorClosestTo = CursorClosestTo(filteredVerts)
-    #line is selected
-    
-    if len(selFaces) == 0:
-        if snapToClosest is True:
-            SnapCursorToClosestSelected(filteredVerts)
-            return
-        
-        VertsDictForLine(uv_layer, bm, filteredVerts, vertsDict)
-        
-        if AreVectsLinedOnAxis(filteredVerts) is False:
-            ScaleTo0OnAxisAndCursor(filteredVerts, vertsDict, cursorClosestTo)
-            return SuccessFinished(me, startTime)
-                
-        MakeEqualDistanceBetweenVertsInLine(filteredVerts, vertsDict, cursorClosestTo)
-        return SuccessFinished(me, startTime)
-
-    # deselect non quads
-    for nf in nonQuadFaces:
-        for l in nf.loops:
-            luv = l[uv_layer]
-            luv.select = False
-
-    def isFaceSelected(f):
-        return f.select and all(l[uv_layer].select for l in f.loops)
-
-    def getIslandFromFace(startFace):
-        island = set()
-        toCheck = set([startFace])
-
-        while (len(toCheck)):
-            face = toCheck.pop()
-            if isFaceSelected(face) and face not in island:
-                island.add(face)
-                adjacentFaces = []
-                for e in face.edges:
-                    if e.seam is False:
-                        for f in e.link_faces:
-                            if f is not face:
-                                adjacentFaces.append(f)
-                toCheck.update(adjacentFaces)
-
-        return island
-
-    def getIslandsFromSelectedFaces(selectedFaces):
-        islands = []
-        toCheck = set(selectedFaces)
-        while(len(toCheck)):
-            face = toCheck.pop()
-            island = getIslandFromFace(face)
-            islands.append(island)
-            toCheck.difference_update(island)
-        return islands
-
-    islands = getIslandsFromSelectedFaces(selFaces)
-
-    def main2 (targetFace, faces):
-        ShapeFace(uv_layer, operator, targetFace, vertsDict, square)
-        
-        if square: FollowActiveUV(operator, me, targetFace, faces, 'EVEN')
-        else: FollowActiveUV(operator, me, targetFace, faces)
-
-    for island in islands:
-        targetFace = bm.faces.active
-        if (targetFace is None or
-            targetFace not in island or
-            len(islands) > 1 or
-            targetFace.select is False or
-            len(targetFace.verts) != 4):
-                targetFace = next(iter(island))
-        
-        main2(targetFace, island)
-
-    if noEdge is False:
-        #edge has ripped so we connect it back 
-        for ev in edgeVerts:
-            key = (round(ev.uv.x, precision), round(ev.uv.y, precision))
-            if key in vertsDict:
-                ev.uv = vertsDict[key][0].uv
-                ev.select = True
-        
-    return SuccessFinished(me, startTime)
+    if len(me.uv_layers.active.data) == len(me.loops):
+        return ReadMesh(me, activeFace)
+
+    #since 3.5 attributes of a mesh in edit mode read as empty, those of its copy don't
+    copy = me.copy()
+    try:
+        return ReadMesh(copy, activeFace, me.as_pointer())
+    finally:
+        bpy.data.meshes.remove(copy)
+
+def ReadMesh(me, activeFace = -1, pointer = None):
+    #pointer of the mesh whose topology is cached, when me is a copy of it
+    uvLayer = me.uv_layers.active
+
+    loopCount = len(me.loops)
+    faceCount = len(me.polygons)
+    edgeCount = len(me.edges)
+    vertCount = len(me.vertices)
+
+    uv = np.empty(loopCount*2, dtype=np.float32)
+    loopSelect = np.empty(loopCount, dtype=bool)
+    loopVert = np.empty(loopCount, dtype=np.int32)
+    loopEdge = np.empty(loopCount, dtype=np.int32)
+    faceTotal = np.empty(faceCount, dtype=np.int32)
+    faceSelect = np.empty(faceCount, dtype=bool)
+    edgeSeam = np.empty(edgeCount, dtype=bool)
+    vertCo = np.empty(vertCount*3, dtype=np.float32)
+
+    uvLayer.data.foreach_get("uv", uv)
+    uvLayer.data.foreach_get("select", loopSelect)
+    me.loops.foreach_get("vertex_index", loopVert)
+    me.loops.foreach_get("edge_index", loopEdge)
+    me.polygons.foreach_get("loop_total", faceTotal)
+    me.polygons.foreach_get("select", faceSelect)
+    me.edges.foreach_get("use_seam", edgeSeam)
+    me.vertices.foreach_get("co", vertCo)
+
+    def ReadTopology():
+        faceStart = np.empty(faceCount, dtype=np.int32)
+        edgeVerts = np.empty(edgeCount*2, dtype=np.int32)
+        me.polygons.foreach_get("loop_start", faceStart)
+        me.edges.foreach_get("vertices", edgeVerts)
+        return core.MeshTopology(faceStart, faceTotal, loopVert, loopEdge, edgeVerts)
+
+    if pointer is None: pointer = me.as_pointer()
+    key = core.TopologyKey(pointer, vertCount, edgeCount, loopVert, loopEdge, faceTotal)
+    topology = core.topologyCache.get(key, ReadTopology)
+
+    return core.UvMesh(uv, loopSelect, faceSelect, edgeSeam, vertCo, topology, activeFace)
+
+def WriteUvMesh(mesh, obj, bm, uv_layer, uv, loopSelect):
+    #only loops whose stored uv or selection differ from uv and loopSelect (as read) are written back
+    newUv = mesh.uv.astype(np.float32)
+    changed = (newUv != uv.astype(np.float32)).any(axis=1) | (mesh.loopSelect != loopSelect)
+    count = int(changed.sum())
+    if count == 0: return 0, False
+
+    if count >= rebuildLoopCount and count*5 >= len(changed) and obj.data.shape_keys is None:
+        RebuildEditMesh(obj, bm, newUv, mesh.loopSelect)
+        return count, True
+
+    #faces are walked in order once, only the ones with a changed loop are entered
+    faceChanged = np.logical_or.reduceat(changed, mesh.faceStart) if len(mesh.faceStart) else []
+    changed = changed.tolist()
+    newUv = newUv.tolist()
+    select = mesh.loopSelect.tolist()
+    for face, faceHasChange, i in zip(bm.faces, faceChanged.tolist(), mesh.faceStart.tolist()):
+        if not faceHasChange: continue
+        for l in face.loops:
+            if changed[i]:
+                luv = l[uv_layer]
+                luv.uv = newUv[i]
+                luv.select = select[i]
+            i += 1
+    return count, False
+
+def RebuildEditMesh(obj, bm, uv, loopSelect):
+    #uvs are written in bulk to a copy of the mesh and the edit mesh is loaded from it, like leaving and entering edit mode
+    #shape keys would not survive it, meshes with them are written loop by loop
+    me = obj.data
+    obj.update_from_editmode()
+    copy = me.copy()
+    try:
+        uvLayer = copy.uv_layers.active
+        uvLayer.data.foreach_set("uv", uv.ravel())
+        #since 3.5 the selection is a layer of its own, setting it through data crashes while it doesn't exist
+        if hasattr(uvLayer, "vertex_selection"): uvLayer.vertex_selection.foreach_set("value", loopSelect)
+        else: uvLayer.data.foreach_set("select", loopSelect)
+        bm.clear()
+        bm.from_mesh(copy)
+    finally:
+        bpy.data.meshes.remove(copy)
 
 '''def ScaleSelection(factor, pivot = 'CURSOR'):
     last_pivot = bpy.context.space_data.pivot_point
@@ -160,336 +272,47 @@ def main1(obj, context, operator, square, snapToClosest):
     bpy.context.space_data.pivot_point = last_pivot
     return'''
 
-def ShapeFace(uv_layer, operator, targetFace, vertsDict, square):
-    corners = []
-    for l in targetFace.loops:
-        luv = l[uv_layer]
-        corners.append(luv)
-    
-    if len(corners) != 4: 
-        #operator.report({'ERROR'}, "bla")
-        return
-    
-    lucv, ldcv, rucv, rdcv = Corners(corners)
-    
-    cct = CursorClosestTo([lucv, ldcv, rdcv, rucv])
-    MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, cct, square)
-    return
-
-def MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, startv, square = False):
-    sizeX, sizeY = ImageSize()
-    ratio = sizeX/sizeY
-    
-    if startv is None: startv = lucv.uv
-    elif AreVertsQuasiEqual(startv, rucv): startv = rucv.uv
-    elif AreVertsQuasiEqual(startv, rdcv): startv = rdcv.uv
-    elif AreVertsQuasiEqual(startv, ldcv): startv = ldcv.uv
-    else: startv = lucv.uv
-    
-    lucv = lucv.uv
-    rucv = rucv.uv
-    rdcv = rdcv.uv
-    ldcv = ldcv.uv    
-   
-    if (startv == lucv): 
-        finalScaleX = hypotVert(lucv, rucv)
-        finalScaleY = hypotVert(lucv, ldcv)
-        currRowX = lucv.x
-        currRowY = lucv.y
-    
-    elif (startv == rucv):
-        finalScaleX = hypotVert(rucv, lucv)
-        finalScaleY = hypotVert(rucv, rdcv)
-        currRowX = rucv.x - finalScaleX
-        currRowY = rucv.y
-       
-    elif (startv == rdcv):
-        finalScaleX = hypotVert(rdcv, ldcv)
-        finalScaleY = hypotVert(rdcv, rucv)
-        currRowX = rdcv.x - finalScaleX
-        currRowY = rdcv.y + finalScaleY
-        
-    else:
-        finalScaleX = hypotVert(ldcv, rdcv)
-        finalScaleY = hypotVert(ldcv, lucv)
-        currRowX = ldcv.x
-        currRowY = ldcv.y +finalScaleY
-    
-    if square: finalScaleY = finalScaleX*ratio
-    #lucv, rucv
-    x = round(lucv.x, precision)
-    y = round(lucv.y, precision)
-    for v in vertsDict[(x,y)]:
-        v.uv.x = currRowX
-        v.uv.y = currRowY
-  
-    x = round(rucv.x, precision)
-    y = round(rucv.y, precision)
-    for v in vertsDict[(x,y)]:
-        v.uv.x = currRowX + finalScaleX
-        v.uv.y = currRowY
-    
-    #rdcv, ldcv
-    x = round(rdcv.x, precision)
-    y = round(rdcv.y, precision)    
-    for v in vertsDict[(x,y)]:
-        v.uv.x = currRowX + finalScaleX
-        v.uv.y = currRowY - finalScaleY
-        
-    x = round(ldcv.x, precision)
-    y = round(ldcv.y, precision)    
-    for v in vertsDict[(x,y)]:
-        v.uv.x = currRowX
-        v.uv.y = currRowY - finalScaleY
-
-        
-    return
-
-def SnapCursorToClosestSelected(filteredVerts):
-    #TODO: snap to closest selected 
-    if len(filteredVerts) == 1: 
-        SetAll2dCursorsTo(filteredVerts[0].uv.x, filteredVerts[0].uv.y)
-    
-    return
-
-def ListsOfVerts(uv_layer, bm):
-    edgeVerts = []
-    allEdgeVerts = []
-    filteredVerts = []
-    selFaces = []
-    nonQuadFaces = []
-    vertsDict = defaultdict(list)                #dict
-    
-    for f in bm.faces:
-        isFaceSel = True
-        facesEdgeVerts = []
-        if (f.select == False):
-            continue
-        
-        #collect edge verts if any
-        for l in f.loops:
-            luv = l[uv_layer]
-            if luv.select is True:
-                facesEdgeVerts.append(luv)
-            else: isFaceSel = False
-        
-        allEdgeVerts.extend(facesEdgeVerts)
-        if isFaceSel:            
-            if len(f.verts) != 4:
-                nonQuadFaces.append(f)
-                edgeVerts.extend(facesEdgeVerts)
-            else: 
-                selFaces.append(f)
-                
-                for l in f.loops:
-                    luv = l[uv_layer]
-                    x = round(luv.uv.x, precision)
-                    y = round(luv.uv.y, precision)
-                    vertsDict[(x, y)].append(luv)
-        
-        else: edgeVerts.extend(facesEdgeVerts)
-    
-    noEdge = False
-    if len(edgeVerts) == 0:
-        noEdge = True
-        edgeVerts.extend(allEdgeVerts)
-    
-    if len(selFaces) == 0:
-        for ev in edgeVerts:
-            if ListQuasiContainsVect(filteredVerts, ev) is False:
-                filteredVerts.append(ev)
-    else: filteredVerts = edgeVerts
-        
-    return edgeVerts, filteredVerts, selFaces, nonQuadFaces, vertsDict, noEdge
-
-def ListQuasiContainsVect(list, vect):
-    for v in list:
-        if AreVertsQuasiEqual(v, vect):
-            return True
-    return False
-
-#modified ideasman42's uvcalc_follow_active.py
-def FollowActiveUV(operator, me, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE'):
-    bm = bmesh.from_edit_mesh(me)
-    uv_act = bm.loops.layers.uv.active
-    
-    # our own local walker
-    def walk_face_init(faces, f_act):
-        # first tag all faces True (so we dont uvmap them)
-        for f in bm.faces:
-            f.tag = True
-        # then tag faces arg False
-        for f in faces:
-            f.tag = False
-        # tag the active face True since we begin there
-        f_act.tag = True
-
-    def walk_face(f):
-        # all faces in this list must be tagged
-        f.tag = True
-        faces_a = [f]
-        faces_b = []
-
-        while faces_a:
-            for f in faces_a:
-                for l in f.loops:
-                    l_edge = l.edge
-                    if (l_edge.is_manifold is True) and (l_edge.seam is False):
-                        l_other = l.link_loop_radial_next
-                        f_other = l_other.face
-                        if not f_other.tag:
-                            yield (f, l, f_other)
-                            f_other.tag = True
-                            faces_b.append(f_other)
-            # swap
-            faces_a, faces_b = faces_b, faces_a
-            faces_b.clear()
-
-    def walk_edgeloop(l):
-        """
-        Could make this a generic function
-        """
-        e_first = l.edge
-        e = None
-        while True:
-            e = l.edge
-            yield e
-
-            # don't step past non-manifold edges
-            if e.is_manifold:
-                # welk around the quad and then onto the next face
-                l = l.link_loop_radial_next
-                if len(l.face.verts) == 4:
-                    l = l.link_loop_next.link_loop_next
-                    if l.edge is e_first:
-                        break
-                else:
-                    break
-            else:
-                break
-
-    def extrapolate_uv(fac,
-                       l_a_outer, l_a_inner,
-                       l_b_outer, l_b_inner):
-        l_b_inner[:] = l_a_inner
-        l_b_outer[:] = l_a_inner + ((l_a_inner - l_a_outer) * fac)
-
-    def apply_uv(f_prev, l_prev, f_next):
-        l_a = [None, None, None, None]
-        l_b = [None, None, None, None]
-
-        l_a[0] = l_prev
-        l_a[1] = l_a[0].link_loop_next
-        l_a[2] = l_a[1].link_loop_next
-        l_a[3] = l_a[2].link_loop_next
-
-        #  l_b
-        #  +-----------+
-        #  |(3)        |(2)
-        #  |           |
-        #  |l_next(0)  |(1)
-        #  +-----------+
-        #        ^
-        #  l_a   |
-        #  +-----------+
-        #  |l_prev(0)  |(1)
-        #  |    (f)    |
-        #  |(3)        |(2)
-        #  +-----------+
-        #  copy from this face to the one above.
-
-        # get the other loops
-        l_next = l_prev.link_loop_radial_next
-        if l_next.vert != l_prev.vert:
-            l_b[1] = l_next
-            l_b[0] = l_b[1].link_loop_next
-            l_b[3] = l_b[0].link_loop_next
-            l_b[2] = l_b[3].link_loop_next
-        else:
-            l_b[0] = l_next
-            l_b[1] = l_b[0].link_loop_next
-            l_b[2] = l_b[1].link_loop_next
-            l_b[3] = l_b[2].link_loop_next
-
-        l_a_uv = [l[uv_act].uv for l in l_a]
-        l_b_uv = [l[uv_act].uv for l in l_b]
-
-        if EXTEND_MODE == 'LENGTH_AVERAGE':
-            try:
-                fac = edge_lengths[l_b[2].edge.index][0] / edge_lengths[l_a[1].edge.index][0]
-            except ZeroDivisionError:
-                fac = 1.0
-        elif EXTEND_MODE == 'LENGTH':
-            a0, b0, c0 = l_a[3].vert.co, l_a[0].vert.co, l_b[3].vert.co
-            a1, b1, c1 = l_a[2].vert.co, l_a[1].vert.co, l_b[2].vert.co
-
-            d1 = (a0 - b0).length + (a1 - b1).length
-            d2 = (b0 - c0).length + (b1 - c1).length
-            try:
-                fac = d2 / d1
-            except ZeroDivisionError:
-                fac = 1.0
-        else:
-            fac = 1.0
-
-        extrapolate_uv(fac,
-                       l_a_uv[3], l_a_uv[0],
-                       l_b_uv[3], l_b_uv[0])
-
-        extrapolate_uv(fac,
-                       l_a_uv[2], l_a_uv[1],
-                       l_b_uv[2], l_b_uv[1])
-
-    # -------------------------------------------
-    # Calculate average length per loop if needed
-
-    if EXTEND_MODE == 'LENGTH_AVERAGE':
-        bm.edges.index_update()
-        edge_lengths = [None] * len(bm.edges)   #NoneType times the length of edges list
-        
-        for f in faces:
-            # we know its a quad
-            l_quad = f.loops[:] 
-            l_pair_a = (l_quad[0], l_quad[2])
-            l_pair_b = (l_quad[1], l_quad[3])
-
-            for l_pair in (l_pair_a, l_pair_b):
-                if edge_lengths[l_pair[0].edge.index] is None:
-
-                    edge_length_store = [-1.0]
-                    edge_length_accum = 0.0
-                    edge_length_total = 0
-
-                    for l in l_pair:
-                        if edge_lengths[l.edge.index] is None:
-                            for e in walk_edgeloop(l):
-                                if edge_lengths[e.index] is None:
-                                    edge_lengths[e.index] = edge_length_store
-                                    edge_length_accum += e.calc_length()
-                                    edge_length_total += 1
-
-                    edge_length_store[0] = edge_length_accum / edge_length_total
-
-    # done with average length
-    # ------------------------
-
-    walk_face_init(faces, f_act)
-    for f_triple in walk_face(f_act):
-        apply_uv(*f_triple)
-
-    bmesh.update_edit_mesh(me, loop_triangles=False)
-
 '''----------------------------------'''
 
-def SuccessFinished(me, startTime):
+def SuccessFinished(startTime, operator = None, stages = None):
+    global lastRun
     #use for backtrack of steps 
     #bpy.ops.ed.undo_push()
-    bmesh.update_edit_mesh(me)
     elapsed = round(timer()-startTime, 2)
-    #if (elapsed >= 0.05): operator.report({'INFO'}, "UvSquares finished, elapsed:", elapsed, "s.")
-    if (elapsed >= 0.05): print("UvSquares finished, elapsed:", elapsed, "s.")
+    if stages is None: stages = core.Stages()
+    label = operator.bl_label if operator is not None else "UvSquares"
+    lastRun = (label, elapsed, stages)
+    DumpStages(operator, timer()-startTime, stages)
+
+    if (elapsed >= 0.05):
+        print("UvSquares finished, elapsed:", elapsed, "s.", stages.summary())
+        if operator is not None:
+            operator.report({'INFO'}, "UvSquares finished, elapsed: %.2f s. %s" % (elapsed, stages.summary()))
     return
 
+def ProfilePath():
+    #UVSQUARES_PROFILE=file.json appends the stages of every run, file.prof gets cProfile stats
+    return os.environ.get("UVSQUARES_PROFILE", "")
+
+def DumpStages(operator, elapsed, stages):
+    path = ProfilePath()
+    if path == "" or path.endswith(".prof"): return
+    record = {"operator": operator.bl_idname if operator is not None else "",
+              "seconds": elapsed, "stages": stages.asDict()}
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+def Profiled(function, *args, **kwargs):
+    path = ProfilePath()
+    if not path.endswith(".prof"): return function(*args, **kwargs)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
 '''def SymmetrySelected(axis, pivot = "MEDIAN"):
     last_pivot = bpy.context.space_data.pivot_point
     bpy.context.space_data.pivot_point = pivot
@@ -497,227 +320,32 @@ def SuccessFinished(me, startTime):
     bpy.context.space_data.pivot_point = last_pivot
     return'''
 
-def AreVectsLinedOnAxis(verts):
-    areLinedX = True
-    areLinedY = True
-    allowedError = 0.00001
-    valX = verts[0].uv.x
-    valY = verts[0].uv.y
-    for v in verts:
-        if abs(valX - v.uv.x) > allowedError:
-            areLinedX = False
-        if abs(valY - v.uv.y) > allowedError:
-            areLinedY = False
-    return areLinedX or areLinedY  
-
-def MakeEqualDistanceBetweenVertsInLine(filteredVerts, vertsDict, startv = None):    
-    verts = filteredVerts
-    verts.sort(key=lambda x: x.uv[0])      #sort by .x
-    
-    first = verts[0].uv
-    last = verts[len(verts)-1].uv
-    
-    horizontal = True
-    if ((last.x - first.x) >0.00001):
-        slope = (last.y - first.y)/(last.x - first.x)
-        if (slope > 1) or (slope <-1):
-            horizontal = False 
-    else: 
-        horizontal = False
-    
-    if horizontal is True:
-        length = hypot(first.x - last.x, first.y - last.y)
-        
-        if startv is last:
-            currentX = last.x - length
-            currentY = last.y
-        else:
-            currentX = first.x
-            currentY = first.y
-    else:
-        verts.sort(key=lambda x: x.uv[1])  #sort by .y
-        verts.reverse()     #reverse because y values drop from up to down
-        first = verts[0].uv
-        last = verts[len(verts)-1].uv
-        
-        length = hypot(first.x - last.x, first.y - last.y)  # we have to call length here because if it is not Hor first and second can not actually be first and second
-        
-        if startv is last:
-            currentX = last.x
-            currentY = last.y + length
-        
-        else:
-            currentX = first.x
-            currentY = first.y
-        
-    numberOfVerts = len(verts)
-    finalScale = length / (numberOfVerts-1)
-    
-    if horizontal is True:
-        first = verts[0]
-        last = verts[len(verts)-1]
-        
-        for v in verts:
-            v = v.uv
-            x = round(v.x, precision)
-            y = round(v.y, precision)
-            
-            for vert in vertsDict[(x,y)]:
-                vert.uv.x = currentX
-                vert.uv.y = currentY
-            
-            currentX = currentX + finalScale
-    else:    
-        for v in verts:
-            x = round(v.uv.x, precision)
-            y = round(v.uv.y, precision)
-            
-            for vert in vertsDict[(x,y)]:
-                vert.uv.x = currentX
-                vert.uv.y = currentY
-            
-            currentY = currentY - finalScale
-    return
-
-def VertsDictForLine(uv_layer, bm, selVerts, vertsDict):
-    for f in bm.faces:
-        for l in f.loops:
-                luv = l[uv_layer]
-                if luv.select is True:
-                    x = round(luv.uv.x, precision)
-                    y = round(luv.uv.y, precision)
-         
-                    vertsDict[(x, y)].append(luv)
-    return
-
-def ScaleTo0OnAxisAndCursor(filteredVerts, vertsDict, startv = None, horizontal = None):      
-    
-    verts = filteredVerts
-    verts.sort(key=lambda x: x.uv[0])      #sort by .x
-    
-    first = verts[0]
-    last = verts[len(verts)-1]
-    
-    if horizontal is None:
-        horizontal = True
-        if ((last.uv.x - first.uv.x) >0.00001):
-            slope = (last.uv.y - first.uv.y)/(last.uv.x - first.uv.x)
-            if (slope > 1) or (slope <-1):
-                horizontal = False 
-        else: 
-            horizontal = False
-    
-    if horizontal is True:
-        if startv is None:
-            startv = first  
-        
-        SetAll2dCursorsTo(startv.uv.x, startv.uv.y)
-        #scale to 0 on Y
-        ScaleTo0('Y')
-        return
-       
-    else:
-        verts.sort(key=lambda x: x.uv[1])  #sort by .y
-        verts.reverse()     #reverse because y values drop from up to down
-        first = verts[0]
-        last = verts[len(verts)-1]
-        if startv is None:
-            startv = first  
-
-        SetAll2dCursorsTo(startv.uv.x, startv.uv.y)
-        #scale to 0 on X
-        ScaleTo0('X')
-        return
-    
-def ScaleTo0(axis):
-    last_area = bpy.context.area.type
-    bpy.context.area.type = 'IMAGE_EDITOR'
-    last_pivot = bpy.context.space_data.pivot_point
-    bpy.context.space_data.pivot_point = 'CURSOR'
-    
-    for area in bpy.context.screen.areas:
-        if area.type == 'IMAGE_EDITOR':
-            if axis == 'Y':
-                bpy.ops.transform.resize(value=(1, 0, 1), constraint_axis=(False, True, False), mirror=False, proportional_edit_falloff='SMOOTH', proportional_size=1)
-            else:
-                bpy.ops.transform.resize(value=(0, 1, 1), constraint_axis=(True, False, False), mirror=False, proportional_edit_falloff='SMOOTH', proportional_size=1)
-                
-
-    bpy.context.space_data.pivot_point = last_pivot
-    return
-
-
-def hypotVert(v1, v2):
-    hyp = hypot(v1.x - v2.x, v1.y - v2.y)
-    return hyp
-
-def Corners(corners):
-    firstHighest = corners[0]
-    for c in corners:
-        if c.uv.y > firstHighest.uv.y:
-            firstHighest = c    
-    corners.remove(firstHighest)
-    
-    secondHighest = corners[0]
-    for c in corners:
-        if (c.uv.y > secondHighest.uv.y):
-            secondHighest = c
-    
-    if firstHighest.uv.x < secondHighest.uv.x:
-        leftUp = firstHighest
-        rightUp = secondHighest
-    else:
-        leftUp = secondHighest
-        rightUp = firstHighest
-    corners.remove(secondHighest)
-    
-    firstLowest = corners[0]
-    secondLowest = corners[1]
-    
-    if firstLowest.uv.x < secondLowest.uv.x:
-        leftDown = firstLowest
-        rightDown = secondLowest
-    else:
-        leftDown = secondLowest
-        rightDown = firstLowest
-    
-    return leftUp, leftDown, rightUp, rightDown
-
-def ImageSize():
-    ratioX, ratioY = 256,256
-    for a in bpy.context.screen.areas:
-        if a.type == 'IMAGE_EDITOR':
-            img = a.spaces[0].image
-            if img is not None and img.size[0] == not 0:
-                ratioX, ratioY = img.size[0], img.size[1]
-            break
-    return ratioX, ratioY
-
-def CursorClosestTo(verts):
-    sizeX, sizeY = ImageSize()
-    if bpy.app.version >= (2, 80, 0):
-        sizeX, sizeY = 1,1
-    min = float('inf')
-    minV = verts[0]
-    for v in verts:
-        if v is None: continue
-        for area in bpy.context.screen.areas:
-            if area.type == 'IMAGE_EDITOR':
-                loc = area.spaces[0].cursor_location
-                hyp = hypot(loc.x/sizeX -v.uv.x, loc.y/sizeY -v.uv.y)
-                if (hyp < min):
-                    min = hyp
-                    minV = v
-    return minV
-
-def SetAll2dCursorsTo(x,y):
-    last_area = bpy.context.area.type
-    bpy.context.area.type = 'IMAGE_EDITOR'
-   
-    bpy.ops.uv.cursor_set(location=(x, y))
-
-    bpy.context.area.type = last_area
-    return
+class EditorSnapshot:
+    """2d cursors and image size of the UV Editors, read once per operator run.
+
+    Cursors are normalised uv locations, one per Image Editor. Without an Image
+    Editor (background mode) they are backgroundCursors and the image size is the default.
+    """
+    def __init__(self, screen):
+        self.areas = []
+        if screen is not None:
+            self.areas = [area for area in screen.areas if area.type == 'IMAGE_EDITOR']
+
+        self.imageSize = (256, 256)
+        if len(self.areas):
+            img = self.areas[0].spaces[0].image
+            if img is not None and img.size[0] != 0:
+                self.imageSize = (img.size[0], img.size[1])
+
+        self.cursors = [tuple(area.spaces[0].cursor_location) for area in self.areas]
+        if len(self.areas) == 0: self.cursors = list(backgroundCursors)
+
+    def setCursors(self, x, y):
+        for area in self.areas:
+            area.spaces[0].cursor_location = (x, y)
+            area.tag_redraw()
+        self.cursors = [(x, y)]*len(self.cursors)
+        if len(self.areas) == 0: backgroundCursors[:] = self.cursors
 
 '''def RotateSelected(angle, pivot = None):
     if pivot is None:
@@ -739,122 +367,148 @@ def SetAll2dCursorsTo(x,y):
     
     return'''
 
-def AreVertsQuasiEqual(v1, v2, allowedError = 0.00001):
-    if abs(v1.uv.x -v2.uv.x) < allowedError and abs(v1.uv.y -v2.uv.y) < allowedError:
-        return True
-    return False
-
 def RipUvFaces(context, operator):
     startTime = timer()
     
-    obj = context.active_object
-    me = obj.data
-    bm = bmesh.from_edit_mesh(me)
-    
-    uv_layer = bm.loops.layers.uv.verify()
-    # bm.faces.layers.tex.verify()  # currently blender needs both layers.
-       
-    selFaces = []
-    
-    for f in bm.faces:
-        isFaceSel = True
-        for l in f.loops:
-            luv = l[uv_layer]
-            if luv.select is False:
-                isFaceSel = False
-                break
-    
-        if isFaceSel is True:
-            selFaces.append(f)
-    
-    if len(selFaces) == 0:
-        target = None
-        for f in bm.faces:
-            for l in f.loops:
-                luv = l[uv_layer]
-                if luv.select is True:
-                    target = luv
-                    break
-            if target is not None: break
-        
-        for f in bm.faces:
-            for l in f.loops:
-                luv = l[uv_layer]
-                luv.select = False
-        
-        target.select = True
-        return SuccessFinished(me, startTime)
+    session = UvSession()
+    mesh = session.read(context.active_object)
+    stages = session.stages
 
-    DeselectAll()
-    
-    for sf in selFaces:
-        for l in sf.loops:
-            luv = l[uv_layer]
-            luv.select = True
+    with stages.time("rip", len(mesh.loopSelect)):
+        core.RipUvFaces(mesh)
     
-    return SuccessFinished(me, startTime)
+    session.flush()
+    return SuccessFinished(startTime, operator, stages)
 
 def JoinUvFaces(context, operator):
     startTime = timer()
     
-    obj = context.active_object
-    me = obj.data
-    bm = bmesh.from_edit_mesh(me)
-    
-    uv_layer = bm.loops.layers.uv.verify()
-    # bm.faces.layers.tex.verify()  # currently blender needs both layers.
-    
-    vertsDict = defaultdict(list)        #dict 
+    session = UvSession()
+    mesh = session.read(context.active_object)
              
-    #TODO: radius by image scale
-    radius = 0.002
+    radius = operator.radius if operator.radius_mode == 'FIXED' else None
     
-    for f in bm.faces:
-        for l in f.loops:
-           luv = l[uv_layer]
-           if luv.select is True:
-               x = round(luv.uv.x, precision)
-               y = round(luv.uv.y, precision)
-               vertsDict[(x,y)].append(luv)
-         
-    for key in vertsDict:
-        min = 1
-        minV = None
-        
-        for f in bm.faces:
-            for l in f.loops:
-                luv = l[uv_layer]
-                if luv.select is False:
-                    hyp = hypot(vertsDict[(key[0], key[1])][0].uv.x -luv.uv.x, vertsDict[(key[0], key[1])][0].uv.y -luv.uv.y)
-                    if (hyp <= min) and hyp < radius:
-                        min = hyp
-                        minV = luv
-                        minV.select = True
-        
-            if min != 1:
-                for v in vertsDict[(key[0], key[1])]:
-                    v = v.uv
-                    v.x = minV.uv.x
-                    v.y = minV.uv.y
+    with session.stages.time("join", len(mesh.uv)):
+        radius = core.JoinUvFaces(mesh, radius)
+    operator.report({'INFO'}, "Join radius %.5f" % radius)
     
-    return SuccessFinished(me, startTime)
-
-def DeselectAll():
-    bpy.ops.uv.select_all(action='DESELECT')
-    return
+    session.flush()
+    return SuccessFinished(startTime, operator, session.stages)
 
+def SnapToAxisWithEqual(context, operator):
+    startTime = timer()
+    #both passes share one session, so the meshes are read and updated once
+    session = UvSession()
+    main(context, operator, session=session)
+    main(context, operator, session=session)
+    session.flush()
+    return SuccessFinished(startTime, operator, session.stages)
+
+
+class GridPreview:
+    """Reshape of the selected islands, kept between the updates of the interactive operator.
+
+    Everything up to the lattice of every island is built once, update solves again only
+    the islands whose start corner or mode changed and keeps their edges for drawing.
+    Nothing is written to the meshes before apply.
+    """
+    def __init__(self, context):
+        self.session = UvSession()
+        self.editor = EditorSnapshot(context.screen)
+        self.stages = self.session.stages
+        sizeX, sizeY = self.editor.imageSize
+
+        selected_objects = context.selected_objects
+        if (context.edit_object not in selected_objects):
+            selected_objects.append(context.edit_object)
+
+        self.meshes = []
+        self.islands = []
+        for obj in selected_objects:
+            if (obj.type != "MESH"): continue
+            mesh = self.session.read(obj)
+            with self.stages.time("ListsOfVerts"):
+                edgeVerts, filteredVerts, selFaces, nonQuadFaces, uvVerts, noEdge = core.ListsOfVerts(mesh)
+            if len(selFaces) == 0: continue
+
+            core.DeselectFaces(mesh, nonQuadFaces)
+            self.meshes.append((mesh, edgeVerts, uvVerts, noEdge))
+            with self.stages.time("islands"):
+                for island, loops in core.DetachIslands(mesh, selFaces):
+                    lines = np.stack((np.arange(len(island.uv)), island.loopNext), axis=1).ravel()
+                    self.islands.append((mesh, loops, core.IslandSolver(island, sizeX/sizeY), lines))
+        self.stages.add("islands", 0.0, len(self.islands))
+
+        self.keys = [None]*len(self.islands)
+        self.positions = [None]*len(self.islands)
+        self.cursors = self.editor.cursors
+        self.square = False
+        self.batch = None
+        self.shader = None
+
+    def update(self, cursors, square):
+        startTime = timer()
+        self.cursors = cursors
+        self.square = square
+        changed = False
+        for k, (mesh, loops, solver, lines) in enumerate(self.islands):
+            key = (solver.startCorner(cursors), square)
+            if key == self.keys[k]: continue
+            self.positions[k] = solver.solve(cursors, square)[lines].astype(np.float32)
+            self.keys[k] = key
+            changed = True
+
+        if changed and len(self.islands):
+            if self.shader is None: self.shader = PreviewShader()
+            self.batch = batch_for_shader(self.shader, 'LINES', {"pos": np.concatenate(self.positions)})
+        elapsed = timer() - startTime
+        self.stages.add("preview update", elapsed, 1)
+        return elapsed
+
+    def draw(self):
+        if self.batch is None: return
+        self.shader.bind()
+        self.shader.uniform_float("color", (1.0, 0.55, 0.1, 1.0))
+        self.batch.draw(self.shader)
+
+    def apply(self):
+        with self.stages.time("grid solve", len(self.islands)):
+            for mesh, loops, solver, lines in self.islands:
+                mesh.uv[loops] = solver.solve(self.cursors, self.square)
+
+        for mesh, edgeVerts, uvVerts, noEdge in self.meshes:
+            if noEdge is False:
+                #edge has ripped so we connect it back 
+                with self.stages.time("connect edges", len(edgeVerts)):
+                    core.ConnectEdgeVerts(mesh, edgeVerts, uvVerts)
+        self.session.flush()
+
+def PreviewShader():
+    #the 2D_ names are gone since Blender 4.0
+    try:
+        return gpu.shader.from_builtin('UNIFORM_COLOR')
+    except ValueError:
+        return gpu.shader.from_builtin('2D_UNIFORM_COLOR')
+
+def DrawGridPreview(preview):
+    preview.draw()
 
 class UV_PT_UvSquares(bpy.types.Operator):
     """Reshapes UV faces to a grid of equivalent squares"""
     bl_idname = "uv.uv_squares"
     bl_label = "UVs to grid of squares"
     bl_options = {'REGISTER', 'UNDO'}
+
+    keep_non_quads: bpy.props.BoolProperty(name="Keep Non-Quads",
+        description="Move selected triangles and n-gons along with the grid instead of leaving them behind. Quads joined by them are gridded together",
+        default=False)
+
     @classmethod
     def poll(cls, context):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        main(context, self, True)
+        Profiled(main, context, self, True, keepNonQuads=self.keep_non_quads)
         return {'FINISHED'}
 
 class UV_PT_UvSquaresByShape(bpy.types.Operator):
@@ -863,14 +517,81 @@ class UV_PT_UvSquaresByShape(bpy.types.Operator):
     bl_label = "UVs to grid with respect to shape"
     bl_options = {'REGISTER', 'UNDO'}
 
+    keep_non_quads: bpy.props.BoolProperty(name="Keep Non-Quads",
+        description="Move selected triangles and n-gons along with the grid instead of leaving them behind. Quads joined by them are gridded together",
+        default=False)
+
     @classmethod
     def poll(cls, context):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        main(context, self)
+        Profiled(main, context, self, keepNonQuads=self.keep_non_quads)
         return {'FINISHED'}
 
+class UV_PT_UvSquaresInteractive(bpy.types.Operator):
+    """Reshapes UV faces to a grid while the mouse picks the start corner, S switches square and shape grid"""
+    bl_idname = "uv.uv_squares_interactive"
+    bl_label = "UVs to grid interactively"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    square: bpy.props.BoolProperty(name="Square", description="Start as grid of equivalent squares", default=False)
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'EDIT_MESH' and context.area is not None and context.area.type == 'IMAGE_EDITOR')
+
+    def invoke(self, context, event):
+        if context.scene.tool_settings.use_uv_select_sync:
+            self.report({'ERROR'}, "Please disable 'Keep UV and edit mesh in sync'")
+            return {'CANCELLED'}
+
+        self.startTime = timer()
+        self.preview = GridPreview(context)
+        if len(self.preview.islands) == 0:
+            self.report({'WARNING'}, "No selected quads to reshape")
+            return {'CANCELLED'}
+
+        #the operator may be started from the sidebar, the mouse is read in the main region
+        self.area = context.area
+        self.region = next(r for r in context.area.regions if r.type == 'WINDOW')
+        self.update(event)
+        self.handle = bpy.types.SpaceImageEditor.draw_handler_add(DrawGridPreview, (self.preview,), 'WINDOW', 'POST_VIEW')
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def update(self, event):
+        x, y = self.region.view2d.region_to_view(event.mouse_x - self.region.x, event.mouse_y - self.region.y)
+        elapsed = self.preview.update([(x, y)], self.square)
+        self.area.header_text_set("%s grid: mouse picks the start corner, S: square/shape, "
+                                  "LMB/Enter: apply, RMB/Esc: cancel (%.1f ms)"
+                                  % ("Square" if self.square else "Shape", elapsed*1000))
+        self.area.tag_redraw()
+
+    def finish(self):
+        bpy.types.SpaceImageEditor.draw_handler_remove(self.handle, 'WINDOW')
+        self.area.header_text_set(None)
+        self.area.tag_redraw()
+
+    def modal(self, context, event):
+        if event.type == 'MOUSEMOVE':
+            self.update(event)
+        elif event.type in {'S', 'TAB'} and event.value == 'PRESS':
+            self.square = not self.square
+            self.update(event)
+        elif event.type in {'LEFTMOUSE', 'RET', 'NUMPAD_ENTER'} and event.value == 'PRESS':
+            self.finish()
+            self.preview.apply()
+            SuccessFinished(self.startTime, self, self.preview.stages)
+            return {'FINISHED'}
+        elif event.type in {'RIGHTMOUSE', 'ESC'} and event.value == 'PRESS':
+            self.finish()
+            return {'CANCELLED'}
+        elif event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
+            #view navigation
+            return {'PASS_THROUGH'}
+        return {'RUNNING_MODAL'}
+
 class UV_PT_RipFaces(bpy.types.Operator):
     """Rip UV faces apart"""
     bl_idname = "uv.uv_face_rip"
@@ -882,7 +603,7 @@ class UV_PT_RipFaces(bpy.types.Operator):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        RipUvFaces(context, self)
+        Profiled(RipUvFaces, context, self)
         return {'FINISHED'}
 
 class UV_PT_JoinFaces(bpy.types.Operator):
@@ -891,12 +612,19 @@ class UV_PT_JoinFaces(bpy.types.Operator):
     bl_label = "UV face join"
     bl_options = {'REGISTER', 'UNDO'}
 
+    radius_mode: bpy.props.EnumProperty(name="Radius", description="How far a vertex may be from the one it joins",
+        items=[('AUTO', "Auto", "A quarter of the median length of the selected UV edges"),
+               ('FIXED', "Fixed", "The radius below")],
+        default='AUTO')
+    radius: bpy.props.FloatProperty(name="Fixed Radius", description="Join radius in UV units when the radius is fixed",
+        default=core.defaultJoinRadius, min=1e-6, soft_max=0.1, precision=4)
+
     @classmethod
     def poll(cls, context):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        JoinUvFaces(context, self)
+        Profiled(JoinUvFaces, context, self)
         return {'FINISHED'}
 
 class UV_PT_SnapToAxis(bpy.types.Operator):
@@ -910,7 +638,7 @@ class UV_PT_SnapToAxis(bpy.types.Operator):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        main(context, self)
+        Profiled(main, context, self)
         return {'FINISHED'}
 
 class UV_PT_SnapToAxisWithEqual(bpy.types.Operator):
@@ -924,8 +652,7 @@ class UV_PT_SnapToAxisWithEqual(bpy.types.Operator):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        main(context, self)
-        main(context, self)
+        Profiled(SnapToAxisWithEqual, context, self)
         return {'FINISHED'}
 
 addon_keymaps = []
@@ -958,6 +685,7 @@ class UV_PT_UvSquaresPanel(bpy.types.Panel):
         col = split.column(align=True)
         col.operator(UV_PT_UvSquaresByShape.bl_idname, text="To Grid By Shape", icon = "UV_FACESEL")
         col.operator(UV_PT_UvSquares.bl_idname, text="To Square Grid", icon = "GRID")
+        col.operator(UV_PT_UvSquaresInteractive.bl_idname, text="Interactive Grid", icon = "RESTRICT_SELECT_OFF")
 
         split = layout.split()
         col = split.column(align=True)
@@ -976,6 +704,14 @@ class UV_PT_UvSquaresPanel(bpy.types.Panel):
         row = layout.row()
         row.label(text="V - Join (Stitch), I -Toggle Islands")
 
+        if lastRun is not None:
+            label, elapsed, stages = lastRun
+            box = layout.box()
+            col = box.column(align=True)
+            col.label(text="Last run: %.2f s" % elapsed)
+            for name, (seconds, count) in stages.entries.items():
+                col.label(text="%s: %.1f ms (%d)" % (name, seconds*1000, count))
+
 def register():
     bpy.utils.register_class(UV_PT_UvSquaresPanel)
     bpy.utils.register_class(UV_PT_UvSquares)
@@ -984,6 +720,7 @@ def register():
     bpy.utils.register_class(UV_PT_JoinFaces)
     bpy.utils.register_class(UV_PT_SnapToAxis)
     bpy.utils.register_class(UV_PT_SnapToAxisWithEqual)
+    bpy.utils.register_class(UV_PT_UvSquaresInteractive)
 
     #menu
     bpy.types.IMAGE_MT_uvs.append(menu_func_uv_squares)
@@ -1008,6 +745,12 @@ def register():
         addon_keymaps.append((km, kmi))
 
 def unregister():
+    global islandPool
+    core.topologyCache.clear()
+    if islandPool is not None:
+        islandPool.shutdown()
+        islandPool = None
+
     bpy.utils.unregister_class(UV_PT_UvSquaresPanel)
     bpy.utils.unregister_class(UV_PT_UvSquares)
     bpy.utils.unregister_class(UV_PT_UvSquaresByShape)
@@ -1015,6 +758,7 @@ def unregister():
     bpy.utils.unregister_class(UV_PT_JoinFaces)
     bpy.utils.unregister_class(UV_PT_SnapToAxis)
     bpy.utils.unregister_class(UV_PT_SnapToAxisWithEqual)
+    bpy.utils.unregister_class(UV_PT_UvSquaresInteractive)
 
     bpy.types.IMAGE_MT_uvs.remove(menu_func_uv_squares)
     bpy.types.IMAGE_MT_uvs.remove(menu_func_uv_squares_by_shape)
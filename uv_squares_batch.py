@@ -0,0 +1,246 @@
+#    <Uv Squares, Blender addon for reshaping UV vertices to grid.>
+#    Copyright (C) <2020> <Reslav Hollos>
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Apply "To Grid By Shape" or "To Square Grid" to many .blend files at once.
+
+Run it with any Python 3, it starts one background Blender per file, as many at
+once as there are cores:
+
+    python uv_squares_batch.py --blender /path/to/blender --mode square \\
+        --select material:Floor --output-dir reshaped --report report.json a.blend b.blend
+
+Faces are picked with --select: "quads" (all quads), "material:NAME" or
+"face_map:NAME". Results are saved into --output-dir under the names of the
+input files, the input files are only overwritten with --in-place. A file is
+saved only when every object of it was reshaped. The report lists the time and
+the outcome of every file.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(description="Reshape UVs of many .blend files to grid.")
+    parser.add_argument("files", nargs="*", help=".blend files to process")
+    parser.add_argument("--blender", default="blender", help="Blender executable")
+    parser.add_argument("--mode", choices=("square", "shape"), default="square",
+                        help="square: To Square Grid, shape: To Grid By Shape")
+    parser.add_argument("--select", default="quads",
+                        help="faces to reshape: quads, material:NAME or face_map:NAME")
+    parser.add_argument("--objects", default="",
+                        help="comma separated object names, all mesh objects when empty")
+    parser.add_argument("--ratio", type=float, default=1.0,
+                        help="image width/height used for square cells")
+    parser.add_argument("--keep-non-quads", action="store_true",
+                        help="move the selected triangles and n-gons along with the grid")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of Blender processes running at once")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per file")
+    parser.add_argument("--output-dir", default="", help="save results into this folder")
+    parser.add_argument("--in-place", action="store_true", help="overwrite the input files")
+    parser.add_argument("--report", default="", help="write the JSON report to this file")
+    #used by the background Blender started for every file
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if not args.worker:
+        if args.ratio <= 0:
+            parser.error("--ratio has to be positive")
+        if bool(args.output_dir) == args.in_place:
+            parser.error("give either --output-dir or --in-place")
+        names = [os.path.basename(f) for f in args.files]
+        if args.output_dir and len(set(names)) != len(names):
+            parser.error("files with the same name would overwrite each other in --output-dir")
+    return args
+
+'''------------------------ driver ------------------------'''
+
+def RunFile(args, path):
+    startTime = timer()
+    with tempfile.TemporaryDirectory() as tmp:
+        resultPath = os.path.join(tmp, "result.json")
+        command = [args.blender, "-b", "--factory-startup", path,
+                   "--python", os.path.abspath(__file__), "--",
+                   "--worker", "--result", resultPath,
+                   "--mode", args.mode, "--select", args.select,
+                   "--objects", args.objects, "--ratio", str(args.ratio),
+                   "--output-dir", os.path.abspath(args.output_dir) if args.output_dir else ""]
+        if args.in_place:
+            command.append("--in-place")
+        if args.keep_non_quads:
+            command.append("--keep-non-quads")
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     universal_newlines=True, timeout=args.timeout)
+            output = process.stdout
+        except subprocess.TimeoutExpired:
+            return {"file": path, "status": "failed", "error": "timed out",
+                    "seconds": round(timer() - startTime, 3)}
+
+        if os.path.exists(resultPath):
+            with open(resultPath) as f:
+                result = json.load(f)
+        else:
+            #blender died before the worker could report
+            result = {"status": "failed", "error": output[-2000:]}
+
+    result["file"] = path
+    result["seconds"] = round(timer() - startTime, 3)
+    return result
+
+def RunBatch(args):
+    startTime = timer()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        #every thread only waits on its own blender process
+        results = list(pool.map(lambda path: RunFile(args, path), args.files))
+
+    for r in results:
+        print("%-8s %8.2fs  %s  %s" % (r["status"], r["seconds"], r["file"], r.get("error", "")))
+    failed = sum(1 for r in results if r["status"] != "ok")
+    elapsed = round(timer() - startTime, 2)
+    print("UvSquares batch finished,", len(results) - failed, "ok,", failed, "failed, elapsed:", elapsed, "s.")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"seconds": elapsed, "files": results}, f, indent=2)
+    return failed == 0
+
+'''------------------------ worker ------------------------'''
+
+def FaceMask(obj, me, rule):
+    import numpy as np
+
+    faceCount = len(me.polygons)
+    if rule == "quads":
+        loopTotal = np.empty(faceCount, dtype=np.int32)
+        me.polygons.foreach_get("loop_total", loopTotal)
+        return loopTotal == 4
+
+    kind, _, name = rule.partition(":")
+    if kind == "material":
+        slots = [i for i, slot in enumerate(obj.material_slots)
+                 if slot.material is not None and slot.material.name == name]
+        materialIndex = np.empty(faceCount, dtype=np.int32)
+        me.polygons.foreach_get("material_index", materialIndex)
+        return np.isin(materialIndex, slots)
+
+    if kind == "face_map":
+        mask = np.zeros(faceCount, dtype=bool)
+        if hasattr(obj, "face_maps"):
+            faceMap = obj.face_maps.get(name)
+            if faceMap is not None and len(me.face_maps):
+                value = np.empty(faceCount, dtype=np.int32)
+                me.face_maps[0].data.foreach_get("value", value)
+                mask = value == faceMap.index
+        else:
+            #face maps are boolean face attributes since Blender 4.0
+            attribute = me.attributes.get(name)
+            if attribute is not None and attribute.domain == 'FACE':
+                attribute.data.foreach_get("value", mask)
+        return mask
+
+    raise ValueError("unknown face selection rule: " + rule)
+
+def ReshapeObject(obj, args):
+    import numpy as np
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import uv_squares
+    core = uv_squares.core
+
+    me = obj.data
+    faceSelect = FaceMask(obj, me, args.select)
+    if not faceSelect.any():
+        return 0
+    if me.uv_layers.active is None:
+        me.uv_layers.new()
+
+    mesh = uv_squares.ReadMesh(me)
+    mesh.faceSelect = faceSelect
+    mesh.loopSelect = mesh.faceSelect[mesh.loopFace]
+    #without quads Reshape would take the selection for a line
+    quadCount = int((faceSelect & (mesh.faceTotal == 4)).sum())
+    if quadCount == 0:
+        return 0
+
+    #the same pipeline as the operators, with no UV Editor and so no 2d cursor
+    core.Reshape([mesh], uv_squares.EditorSnapshot(None), args.mode == "square", ratio=args.ratio,
+                 keepNonQuads=args.keep_non_quads)
+
+    me.uv_layers.active.data.foreach_set("uv", mesh.uv.astype(np.float32).ravel())
+    me.update()
+    return quadCount
+
+def RunWorker(args):
+    import bpy
+
+    result = {"status": "ok", "objects": []}
+    try:
+        if not bpy.data.filepath:
+            raise ValueError("the file could not be opened")
+        if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        names = set(n for n in args.objects.split(",") if n)
+        done = set()
+        for obj in bpy.data.objects:
+            if obj.type != 'MESH' or (names and obj.name not in names):
+                continue
+            #meshes shared by several objects are reshaped once
+            if obj.data in done or obj.data.library is not None:
+                continue
+            done.add(obj.data)
+
+            startTime = timer()
+            entry = {"object": obj.name}
+            try:
+                entry["faces"] = ReshapeObject(obj, args)
+            except Exception as e:
+                entry["error"] = repr(e)
+                result["status"] = "failed"
+            entry["seconds"] = round(timer() - startTime, 3)
+            result["objects"].append(entry)
+
+        if result["status"] != "ok":
+            result["error"] = "not saved, some objects failed"
+        elif args.output_dir:
+            path = os.path.join(args.output_dir, os.path.basename(bpy.data.filepath))
+            bpy.ops.wm.save_as_mainfile(filepath=path, copy=True)
+        elif args.in_place:
+            bpy.ops.wm.save_mainfile()
+        else:
+            raise ValueError("neither --output-dir nor --in-place given, nothing saved")
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = repr(e)
+
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    args = ParseArgs(argv)
+    if args.worker:
+        RunWorker(args)
+    else:
+        sys.exit(0 if RunBatch(args) else 1)
@@ -0,0 +1,418 @@
+#    <Uv Squares, Blender addon for reshaping UV vertices to grid.>
+#    Copyright (C) <2020> <Reslav Hollos>
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Time every UV Squares operator on generated meshes of growing size.
+
+The operators need an UV Editor, so run it in Blender with its interface:
+
+    blender --factory-startup --python uv_squares_benchmark.py -- \\
+        --sizes 1000,10000,100000,1000000 --output benchmark.json
+
+Meshes are flat grids, cylinders with a seam, atlases of many small islands,
+noisy scan-like grids with n-gons and triangles mixed in and single rows of
+quads, whose line selection is as long as the mesh. Every operator runs
+--repeat times on a fresh copy of the UVs, the JSON output keeps every run with
+the stages reported by the addon, so results of two versions can be compared.
+
+--core times the functions of uv_squares_core on the same meshes without
+Blender, with any Python 3 and NumPy:
+
+    python uv_squares_benchmark.py --core --output core.json
+
+Join runs on grids of --join-loops loops with half of the faces moved by a tenth
+of a cell, the dedup of line verts on strips with lines of --line-verts verts
+and the island reshape of an atlas of --grid-faces faces in islands of
+--grid-island by --grid-island quads with every count of spawned --grid-workers,
+1 being the serial map the operator uses on small selections.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import platform
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from timeit import default_timer as timer
+
+import numpy as np
+
+operators = ("uv_squares", "uv_squares_by_shape", "uv_face_rip", "uv_face_join",
+             "uv_snap_to_axis", "uv_snap_to_axis_and_equal")
+meshKinds = ("grid", "cylinder", "atlas", "scan", "strip")
+
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(description="Benchmark UV Squares operators.")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="comma separated face counts")
+    parser.add_argument("--meshes", default=",".join(meshKinds),
+                        help="comma separated mesh kinds: " + ", ".join(meshKinds))
+    parser.add_argument("--operators", default=",".join(operators),
+                        help="comma separated operators: " + ", ".join(operators))
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every operator")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the noise")
+    parser.add_argument("--output", default="uv_squares_benchmark.json", help="JSON results")
+    parser.add_argument("--keep-open", action="store_true", help="don't quit Blender at the end")
+    parser.add_argument("--core", action="store_true", help="time uv_squares_core without Blender")
+    parser.add_argument("--join-loops", default="10000,100000,1000000",
+                        help="comma separated loop counts of the core join timing")
+    parser.add_argument("--line-verts", default="1000,10000,100000",
+                        help="comma separated line lengths of the core dedup timing")
+    parser.add_argument("--grid-faces", type=int, default=100000, help="faces of the core grid timing")
+    parser.add_argument("--grid-island", type=int, default=10,
+                        help="quads along the side of an island of the core grid timing")
+    parser.add_argument("--grid-workers", default="1,2,4",
+                        help="comma separated worker counts of the core grid timing")
+    return parser.parse_args(argv)
+
+'''------------------------ meshes ------------------------'''
+
+class MeshData:
+    """Generated mesh as flat arrays, line holds the verts used for the line operators."""
+    def __init__(self, co, loopVert, loopTotal, loopUv, seams, line):
+        self.co = co
+        self.loopVert = loopVert
+        self.loopTotal = loopTotal
+        self.loopUv = loopUv
+        self.seams = seams
+        self.line = line
+
+def GridQuads(nx, ny, start = 0):
+    #faces of a (nx+1)*(ny+1) vertex grid, rows of vertices go along x
+    i, j = np.meshgrid(np.arange(nx), np.arange(ny))
+    v = (start + j*(nx + 1) + i).ravel()
+    return np.stack((v, v + 1, v + nx + 2, v + nx + 1), axis=1)
+
+def GridSide(faceCount):
+    return max(1, int(round(faceCount ** 0.5)))
+
+def GridMesh(faceCount, rng):
+    n = GridSide(faceCount)
+    x, y = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(0, 1, n + 1))
+    co = np.stack((x.ravel(), y.ravel(), np.zeros(x.size)), axis=1)
+    quads = GridQuads(n, n)
+    return MeshData(co, quads.ravel(), np.full(len(quads), 4), co[quads.ravel(), :2], [],
+                    np.arange(n + 1))
+
+def CylinderMesh(faceCount, rng):
+    n = GridSide(faceCount)
+    #ring of n verts, the uv seam is between the last and the first column
+    quads = GridQuads(n, n)
+    column = quads % (n + 1)
+    row = quads // (n + 1)
+    loopColumn = np.where(column == n, 0, column)
+
+    keep = np.arange((n + 1)**2) % (n + 1) != n
+    angle = 2*np.pi*(np.arange((n + 1)**2) % (n + 1))/n
+    height = (np.arange((n + 1)**2) // (n + 1))/n
+    co = np.stack((np.cos(angle), np.sin(angle), height), axis=1)[keep]
+
+    loopVert = (row*n + loopColumn).ravel()
+    loopUv = np.stack((column/n, row/n), axis=2).reshape(-1, 2)
+    seams = [(r*n, (r + 1)*n) for r in range(n)]
+    return MeshData(co, loopVert, np.full(len(quads), 4), loopUv, seams, np.arange(n))
+
+def AtlasMesh(faceCount, rng, islandSide = 10):
+    islandCount = max(1, faceCount // islandSide**2)
+    columns = int(np.ceil(islandCount ** 0.5))
+    cell = 1.0/columns
+    perIsland = (islandSide + 1)**2
+
+    x, y = np.meshgrid(np.linspace(0, 0.8*cell, islandSide + 1), np.linspace(0, 0.8*cell, islandSide + 1))
+    island = np.stack((x.ravel(), y.ravel()), axis=1)
+    offsets = np.stack((np.arange(islandCount) % columns, np.arange(islandCount) // columns), axis=1)*cell
+    uv = (island[None, :, :] + offsets[:, None, :]).reshape(-1, 2)
+    co = np.concatenate((uv, np.zeros((len(uv), 1))), axis=1)
+
+    quads = np.concatenate([GridQuads(islandSide, islandSide, k*perIsland) for k in range(islandCount)])
+    return MeshData(co, quads.ravel(), np.full(len(quads), 4), uv[quads.ravel()], [],
+                    np.arange(islandSide + 1))
+
+def ScanMesh(faceCount, rng, mergeRate = 0.05, splitRate = 0.03):
+    n = GridSide(faceCount)
+    x, y = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(0, 1, n + 1))
+    noise = rng.normal(0, 0.15/n, (2, n + 1, n + 1))
+    co = np.stack((x.ravel() + noise[0].ravel(), y.ravel() + noise[1].ravel(),
+                   rng.normal(0, 0.5/n, x.size)), axis=1)
+    uv = co[:, :2] + rng.normal(0, 0.05/n, (len(co), 2))
+
+    quads = GridQuads(n, n).reshape(n, n, 4)
+    #pairs of neighbouring quads become hexagons, some other quads become two triangles
+    merge = np.zeros((n, n), dtype=bool)
+    merge[:, 0:n - 1:2] = rng.random((n, len(range(0, n - 1, 2)))) < mergeRate
+    merged = np.zeros((n, n), dtype=bool)
+    merged[:, 1:] = merge[:, :-1]
+    split = ~merge & ~merged & (rng.random((n, n)) < splitRate)
+    plain = ~merge & ~merged & ~split
+
+    left, right = quads[merge], quads[:, 1:][merge[:, :-1]]
+    hexagons = np.stack((left[:, 0], left[:, 1], right[:, 1], right[:, 2], left[:, 2], left[:, 3]), axis=1)
+    halves = quads[split]
+    triangles = np.concatenate((halves[:, [0, 1, 2]], halves[:, [0, 2, 3]]))
+
+    loopVert = np.concatenate((quads[plain].ravel(), hexagons.ravel(), triangles.ravel()))
+    loopTotal = np.concatenate((np.full(plain.sum(), 4), np.full(len(hexagons), 6), np.full(len(triangles), 3)))
+    return MeshData(co, loopVert, loopTotal, uv[loopVert], [], np.arange(n + 1))
+
+def StripMesh(faceCount, rng):
+    #one row of quads, the line is its whole bottom edge
+    x = np.linspace(0, 1, faceCount + 1)
+    co = np.concatenate((np.stack((x, np.zeros(faceCount + 1), np.zeros(faceCount + 1)), axis=1),
+                         np.stack((x, np.full(faceCount + 1, 1.0/faceCount), np.zeros(faceCount + 1)), axis=1)))
+    uv = co[:, :2] + rng.normal(0, 0.1/faceCount, (len(co), 2))
+    quads = GridQuads(faceCount, 1)
+    return MeshData(co, quads.ravel(), np.full(len(quads), 4), uv[quads.ravel()], [],
+                    np.arange(faceCount + 1))
+
+generators = {"grid": GridMesh, "cylinder": CylinderMesh, "atlas": AtlasMesh, "scan": ScanMesh,
+              "strip": StripMesh}
+
+'''------------------------ blender ------------------------'''
+
+def BuildObject(name, data):
+    import bpy
+
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(len(data.co))
+    me.vertices.foreach_set("co", data.co.astype(np.float32).ravel())
+    me.loops.add(len(data.loopVert))
+    me.loops.foreach_set("vertex_index", data.loopVert.astype(np.int32))
+    me.polygons.add(len(data.loopTotal))
+    loopStart = np.concatenate(([0], np.cumsum(data.loopTotal)[:-1])).astype(np.int32)
+    me.polygons.foreach_set("loop_start", loopStart)
+    try:
+        me.polygons.foreach_set("loop_total", data.loopTotal.astype(np.int32))
+    except (AttributeError, TypeError, RuntimeError):
+        #read only since Blender 3.6, it follows loop_start
+        pass
+    me.update(calc_edges=True)
+
+    me.uv_layers.new()
+    if len(data.seams):
+        edgeVerts = np.empty(len(me.edges)*2, dtype=np.int32)
+        me.edges.foreach_get("vertices", edgeVerts)
+        seams = set(map(frozenset, data.seams))
+        me.edges.foreach_set("use_seam", [frozenset(e) in seams for e in edgeVerts.reshape(-1, 2).tolist()])
+
+    obj = bpy.data.objects.new(name, me)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def Selection(operator, data):
+    #loops selected before running the operator
+    faceCount = len(data.loopTotal)
+    loopFace = np.repeat(np.arange(faceCount), data.loopTotal)
+    if operator in ("uv_squares", "uv_squares_by_shape"):
+        return np.ones(len(data.loopVert), dtype=bool)
+    if operator in ("uv_face_rip", "uv_face_join"):
+        return loopFace < faceCount//2
+    return np.isin(data.loopVert, data.line)
+
+def SetUvSelect(uvLayer, select):
+    #since 3.5 the selection is a layer of its own, setting it through data crashes while it doesn't exist
+    if hasattr(uvLayer, "vertex_selection"): uvLayer.vertex_selection.foreach_set("value", select)
+    else: uvLayer.data.foreach_set("select", select)
+
+def ResetUvs(obj, data, select):
+    import bpy
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    me = obj.data
+    me.uv_layers.active.data.foreach_set("uv", data.loopUv.astype(np.float32).ravel())
+    SetUvSelect(me.uv_layers.active, select)
+    me.polygons.foreach_set("select", np.ones(len(me.polygons), dtype=bool))
+    bpy.ops.object.mode_set(mode='EDIT')
+
+def UvEditor():
+    import bpy
+
+    window = bpy.context.window_manager.windows[0]
+    area = max(window.screen.areas, key=lambda a: a.width*a.height)
+    area.type = 'IMAGE_EDITOR'
+    area.spaces[0].mode = 'UV'
+    region = next(r for r in area.regions if r.type == 'WINDOW')
+    return {"window": window, "screen": window.screen, "area": area, "region": region}
+
+def RunOperator(override, obj, name, **options):
+    import bpy
+
+    context = dict(override, active_object=obj, object=obj, edit_object=obj, selected_objects=[obj])
+    function = getattr(bpy.ops.uv, name)
+    if hasattr(bpy.context, "temp_override"):
+        with bpy.context.temp_override(**context):
+            function(**options)
+    else:
+        function(context, **options)
+
+def Benchmark(args):
+    import bpy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import uv_squares
+
+    if not hasattr(bpy.types, "UV_PT_UvSquares"):
+        uv_squares.register()
+    bpy.context.scene.tool_settings.use_uv_select_sync = False
+
+    override = UvEditor()
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for kind in [k for k in args.meshes.split(",") if k]:
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            data = generators[kind](size, rng)
+            for obj in list(bpy.context.scene.objects):
+                bpy.data.objects.remove(obj)
+            obj = BuildObject("%s_%d" % (kind, size), data)
+            bpy.context.view_layer.objects.active = obj
+            obj.select_set(True)
+            bpy.ops.object.mode_set(mode='EDIT')
+
+            for name in [o for o in args.operators.split(",") if o]:
+                select = Selection(name, data)
+                runs = []
+                for r in range(args.repeat):
+                    ResetUvs(obj, data, select)
+                    uv_squares.lastRun = None
+                    startTime = timer()
+                    RunOperator(override, obj, name)
+                    seconds = timer() - startTime
+                    stages = uv_squares.lastRun[2].asDict() if uv_squares.lastRun else {}
+                    runs.append({"seconds": seconds, "stages": stages})
+
+                entry = {"mesh": kind, "size": size, "faces": len(data.loopTotal),
+                         "loops": len(data.loopVert), "operator": name,
+                         "best": min(r["seconds"] for r in runs), "runs": runs}
+                results.append(entry)
+                print("%-9s %8d %-28s %8.3fs" % (kind, entry["faces"], name, entry["best"]))
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+    report = {"blender": bpy.app.version_string, "addon": list(uv_squares.bl_info["version"]),
+              "python": platform.python_version(), "machine": platform.machine(),
+              "cpus": os.cpu_count(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("UvSquares benchmark written to", os.path.abspath(args.output))
+
+'''------------------------ core ------------------------'''
+
+def CoreMesh(data, loopSelect, faceSelect = None):
+    #UvMesh as ReadMesh would give it, edges are made from the loops
+    import uv_squares_core as core
+
+    loopVert = np.asarray(data.loopVert)
+    faceTotal = np.asarray(data.loopTotal)
+    faceStart = np.concatenate(([0], np.cumsum(faceTotal)[:-1]))
+
+    loopNext = np.arange(1, len(loopVert) + 1)
+    loopNext[faceStart + faceTotal - 1] = faceStart
+    pairs = np.sort(np.stack((loopVert, loopVert[loopNext]), axis=1), axis=1)
+    edgeVerts, loopEdge = np.unique(pairs, axis=0, return_inverse=True)
+
+    vertCount = len(data.co)
+    seams = np.sort(np.array(data.seams, dtype=np.int64).reshape(-1, 2), axis=1)
+    edgeSeam = np.isin(edgeVerts[:, 0]*vertCount + edgeVerts[:, 1], seams[:, 0]*vertCount + seams[:, 1])
+
+    if faceSelect is None: faceSelect = np.ones(len(faceTotal), dtype=bool)
+    topology = core.MeshTopology(faceStart, faceTotal, loopVert, loopEdge.ravel(), edgeVerts)
+    return core.UvMesh(data.loopUv, loopSelect, faceSelect, edgeSeam, data.co, topology)
+
+def CopyMesh(mesh):
+    #fresh UVs and selection on the same topology, so every run starts from the same state
+    import uv_squares_core as core
+    return core.UvMesh(mesh.uv, mesh.loopSelect, mesh.faceSelect, mesh.edgeSeam, mesh.vertCo, mesh.topology)
+
+def CoreJoin(loopCount, rng, stack):
+    import uv_squares_core as core
+
+    data = GridMesh(loopCount//4, rng)
+    select = Selection("uv_face_join", data)
+    #a small move that join has to close again
+    data.loopUv = data.loopUv.copy()
+    data.loopUv[select] += 0.1/GridSide(loopCount//4)
+    mesh = CoreMesh(data, select)
+
+    def Prepare():
+        copy = CopyMesh(mesh)
+        return lambda: core.JoinUvFaces(copy)
+    return len(data.loopVert), Prepare
+
+def CoreDedup(vertCount, rng, stack):
+    import uv_squares_core as core
+
+    data = StripMesh(vertCount - 1, rng)
+    mesh = CoreMesh(data, Selection("uv_snap_to_axis", data))
+    #selected loops of the partly selected faces, two of them on every inner vert of the line
+    edgeVerts = core.ListsOfVerts(mesh)[0]
+
+    def Prepare():
+        return lambda: core.QuasiUniqueVerts(mesh.uv, edgeVerts)
+    return len(data.line), Prepare
+
+def CoreGrid(workers, rng, stack, faceCount = 100000, islandSide = 10):
+    import uv_squares_core as core
+
+    data = AtlasMesh(faceCount, rng, islandSide)
+    mesh = CoreMesh(data, Selection("uv_squares", data))
+    selFaces = list(range(len(data.loopTotal)))
+    pool = None
+    if workers > 1:
+        #as the operator's pool, started once and kept, so starting the workers isn't timed
+        pool = stack.enter_context(ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')))
+        list(pool.map(GridSide, range(workers*4)))
+
+    def Prepare():
+        copy = CopyMesh(mesh)
+        return lambda: core.GridMeshes([(copy, selFaces, ())], (), True, 1.0, pool and (lambda islandFaces: pool))
+    return len(data.loopTotal), Prepare
+
+def CoreBenchmark(args):
+    rng = np.random.default_rng(args.seed)
+    grid = lambda workers, rng, stack: CoreGrid(workers, rng, stack, args.grid_faces, args.grid_island)
+    timings = [("join", CoreJoin, args.join_loops), ("dedup", CoreDedup, args.line_verts),
+               ("grid", grid, args.grid_workers)]
+    results = []
+    for name, function, sizes in timings:
+        for size in [int(s) for s in sizes.split(",") if s]:
+            runs = []
+            with ExitStack() as stack:
+                count, Prepare = function(size, rng, stack)
+                for r in range(args.repeat):
+                    run = Prepare()
+                    startTime = timer()
+                    run()
+                    runs.append({"seconds": timer() - startTime})
+
+            entry = {"timing": name, "size": size, "count": count,
+                     "best": min(r["seconds"] for r in runs), "runs": runs}
+            results.append(entry)
+            print("%-9s %8d %8d %8.3fs" % (name, size, count, entry["best"]))
+
+    report = {"engine": "core", "numpy": np.__version__, "python": platform.python_version(),
+              "machine": platform.machine(), "cpus": os.cpu_count(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("UvSquares core benchmark written to", os.path.abspath(args.output))
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    args = ParseArgs(argv)
+    if args.core:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        CoreBenchmark(args)
+    else:
+        Benchmark(args)
+    if not args.core and not args.keep_open:
+        import bpy
+        bpy.ops.wm.quit_blender()
@@ -0,0 +1,1464 @@
+#    <Uv Squares, Blender addon for reshaping UV vertices to grid.>
+#    Copyright (C) <2020> <Reslav Hollos>
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Geometry of UV Squares working on plain arrays, without bpy.
+
+Loops, faces, edges and verts are referred to by their index. The operators in
+uv_squares.py copy the edit mesh into a UvMesh, call into this module and write
+the changed loops back.
+"""
+
+import numpy as np
+import os
+import zlib
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from math import hypot, floor
+from timeit import default_timer as timer
+
+try:
+    from mathutils.kdtree import KDTree
+except ImportError:
+    #outside of blender UvKDTree uses its own tree
+    KDTree = None
+
+class MeshTopology:
+    """Loop, face and edge connectivity of a mesh, it only changes with topology edits.
+
+    Loops are stored face after face, faceStart and faceTotal give the loops of each face.
+    """
+    def __init__(self, faceStart, faceTotal, loopVert, loopEdge, edgeVerts):
+        self.faceStart = np.array(faceStart, dtype=np.int64)
+        self.faceTotal = np.array(faceTotal, dtype=np.int64)
+        self.loopVert = np.array(loopVert, dtype=np.int64)
+        self.loopEdge = np.array(loopEdge, dtype=np.int64)
+        self.edgeVerts = np.array(edgeVerts, dtype=np.int64).reshape(-1, 2)
+
+        loopCount = len(self.loopVert)
+        self.loopFace = np.repeat(np.arange(len(self.faceStart)), self.faceTotal)
+
+        #next loop around the face, the last loop wraps to the first one
+        self.loopNext = np.arange(1, loopCount + 1)
+        faceEnd = self.faceStart + self.faceTotal - 1
+        self.loopNext[faceEnd] = self.faceStart
+
+        #an edge is manifold when exactly two loops use it, those two are each others radial loop
+        edgeLoopCount = np.bincount(self.loopEdge, minlength=len(self.edgeVerts))
+        self.edgeManifold = edgeLoopCount == 2
+        self.loopRadial = np.full(loopCount, -1, dtype=np.int64)
+        order = np.argsort(self.loopEdge, kind='stable')
+        self.edgeLoops = order
+        self.edgeLoopStart = np.concatenate(([0], np.cumsum(edgeLoopCount)))
+        first = self.edgeLoopStart[:-1][self.edgeManifold]
+        a = order[first]
+        b = order[first + 1]
+        self.loopRadial[a] = b
+        self.loopRadial[b] = a
+
+class TopologyCache:
+    """Keeps the MeshTopology of the last few meshes, least recently used is dropped first."""
+    def __init__(self, size = 8):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key, build):
+        topology = self.entries.get(key)
+        if topology is None:
+            topology = build()
+            self.entries[key] = topology
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return topology
+
+    def clear(self):
+        self.entries.clear()
+
+topologyCache = TopologyCache()
+
+def TopologyKey(meshId, vertCount, edgeCount, loopVert, loopEdge, faceTotal):
+    #counts catch most topology edits, the checksum catches the ones keeping the counts
+    checksum = zlib.crc32(np.ascontiguousarray(loopVert).tobytes())
+    checksum = zlib.crc32(np.ascontiguousarray(loopEdge).tobytes(), checksum)
+    checksum = zlib.crc32(np.ascontiguousarray(faceTotal).tobytes(), checksum)
+    return (meshId, vertCount, edgeCount, len(faceTotal), len(loopVert), checksum)
+
+class Stages:
+    """Wall time and item count of every stage of one operator run, in the order they ran."""
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def add(self, name, seconds, count = 0):
+        oldSeconds, oldCount = self.entries.get(name, (0.0, 0))
+        self.entries[name] = (oldSeconds + seconds, oldCount + count)
+
+    @contextmanager
+    def time(self, name, count = 0):
+        startTime = timer()
+        try:
+            yield
+        finally:
+            self.add(name, timer() - startTime, count)
+
+    def merge(self, other):
+        for name, (seconds, count) in other.entries.items():
+            self.add(name, seconds, count)
+
+    def summary(self):
+        return ", ".join("%s %.1f ms (%d)" % (name, seconds*1000, count)
+                         for name, (seconds, count) in self.entries.items())
+
+    def asDict(self):
+        return OrderedDict((name, {"seconds": seconds, "count": count})
+                           for name, (seconds, count) in self.entries.items())
+
+class UvMesh:
+    """UV layer and selection of one mesh as flat arrays, on top of its MeshTopology."""
+    def __init__(self, uv, loopSelect, faceSelect, edgeSeam, vertCo, topology, activeFace = -1):
+        self.uv = np.array(uv, dtype=np.float64).reshape(-1, 2)
+        self.loopSelect = np.array(loopSelect, dtype=bool)
+        self.faceSelect = np.array(faceSelect, dtype=bool)
+        self.edgeSeam = np.array(edgeSeam, dtype=bool)
+        self.vertCo = np.array(vertCo, dtype=np.float64).reshape(-1, 3)
+        self.activeFace = activeFace
+
+        self.topology = topology
+        self.faceStart = topology.faceStart
+        self.faceTotal = topology.faceTotal
+        self.loopVert = topology.loopVert
+        self.loopEdge = topology.loopEdge
+        self.edgeVerts = topology.edgeVerts
+        self.loopFace = topology.loopFace
+        self.loopNext = topology.loopNext
+        self.edgeManifold = topology.edgeManifold
+        self.loopRadial = topology.loopRadial
+        self.edgeLoops = topology.edgeLoops
+        self.edgeLoopStart = topology.edgeLoopStart
+
+class UvVerts:
+    """Groups of loops sharing one mesh vertex and exactly the same uv, as built.
+
+    Groups stay the same while their uvs are moved, so every loop of a group can
+    be moved together. The loops of group g are groupLoops[groupStart[g]:groupStart[g+1]].
+    """
+    def __init__(self, uv, loopVert, loops):
+        self.loops = np.asarray(loops, dtype=np.int64)
+        self.keys, groups = np.unique(UvVertKeys(uv, loopVert, self.loops), return_inverse=True)
+        groups = groups.ravel()
+
+        self.loopGroup = np.full(len(uv), -1, dtype=np.int64)
+        self.loopGroup[self.loops] = groups
+        self.groupLoops = self.loops[np.argsort(groups, kind='stable')]
+        self.groupStart = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=len(self.keys)))))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def group(self, l):
+        g = self.loopGroup[l]
+        if g < 0: return [l]
+        return self.groupLoops[self.groupStart[g]:self.groupStart[g + 1]]
+
+    def move(self, uv, l, location):
+        uv[self.group(l)] = location
+
+    def find(self, uv, loopVert, loops):
+        #group of the vertex and uv each loop has now, -1 when there is none
+        if len(self.keys) == 0: return np.full(len(loops), -1, dtype=np.int64)
+        keys = UvVertKeys(uv, loopVert, np.asarray(loops, dtype=np.int64))
+        groups = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[groups] == keys, groups, -1)
+
+def UvVertKeys(uv, loopVert, loops):
+    #vertex index and the bits of both uv coordinates, -0.0 is turned into 0.0 first
+    keys = np.empty((len(loops), 3), dtype=np.int64)
+    keys[:, 0] = loopVert[loops]
+    keys[:, 1:] = (uv[loops] + 0.0).view(np.int64)
+    return keys.view(np.dtype((np.void, keys.itemsize*3))).ravel()
+
+def FaceLoops(mesh, f):
+    start = int(mesh.faceStart[f])
+    return range(start, start + int(mesh.faceTotal[f]))
+
+def ListsOfVerts(mesh):
+    faces, loops = SelectedFaceLoops(mesh)
+    if len(faces) == 0:
+        return [], [], [], [], UvVerts(mesh.uv, mesh.loopVert, []), True
+
+    #loops of the selected faces come face after face, faceStarts marks where every face begins
+    selected = mesh.loopSelect[loops]
+    faceStarts = np.concatenate(([0], np.cumsum(mesh.faceTotal[faces])[:-1]))
+    isFaceSel = np.logical_and.reduceat(selected, faceStarts)
+    isQuad = mesh.faceTotal[faces] == 4
+
+    selFaces = faces[isFaceSel & isQuad]
+    nonQuadFaces = faces[isFaceSel & ~isQuad]
+    #selected loops of partly selected faces and of selected non quads
+    onEdge = np.repeat(~isFaceSel | ~isQuad, mesh.faceTotal[faces])
+    edgeVerts = loops[selected & onEdge]
+
+    noEdge = False
+    if len(edgeVerts) == 0:
+        noEdge = True
+        edgeVerts = loops[selected]
+    edgeVerts = edgeVerts.tolist()
+
+    if len(selFaces) == 0: filteredVerts = QuasiUniqueVerts(mesh.uv, edgeVerts)
+    else: filteredVerts = edgeVerts
+
+    uvVerts = UvVerts(mesh.uv, mesh.loopVert, FacesLoops(mesh, selFaces))
+    return edgeVerts, filteredVerts, selFaces.tolist(), nonQuadFaces.tolist(), uvVerts, noEdge
+
+def SelectedFaceLoops(mesh):
+    """Selected faces with at least one selected loop, and all their loops.
+
+    Faces without a selected loop add nothing to any selection list, so the work
+    after this one pass over the select array grows with the selection only.
+    """
+    faces = np.unique(mesh.loopFace[np.flatnonzero(mesh.loopSelect)])
+    faces = faces[mesh.faceSelect[faces]]
+    return faces, FacesLoops(mesh, faces)
+
+def FacesLoops(mesh, faces):
+    #loops of all the faces, face after face
+    faces = np.asarray(faces, dtype=np.int64)
+    faceTotal = mesh.faceTotal[faces]
+    first = np.repeat(mesh.faceStart[faces] - np.concatenate(([0], np.cumsum(faceTotal)[:-1])), faceTotal)
+    return first + np.arange(faceTotal.sum())
+
+def QuasiUniqueVerts(uv, verts, allowedError = 0.00001):
+    #first of every group of quasi equal verts, in order
+    #cells are as big as allowedError so a quasi equal vert can only be in a neighbouring cell
+    grid = defaultdict(list)
+    unique = []
+    for v, (x, y) in zip(verts, uv[verts].tolist()):
+        cellX = floor(x/allowedError)
+        cellY = floor(y/allowedError)
+        if not any(abs(x - ux) < allowedError and abs(y - uy) < allowedError
+                   for i in (cellX-1, cellX, cellX+1)
+                   for j in (cellY-1, cellY, cellY+1)
+                   for ux, uy in grid.get((i, j), ())):
+            unique.append(v)
+            grid[(cellX, cellY)].append((x, y))
+    return unique
+
+def AreVertsQuasiEqual(uv, v1, v2, allowedError = 0.00001):
+    if abs(uv[v1, 0] -uv[v2, 0]) < allowedError and abs(uv[v1, 1] -uv[v2, 1]) < allowedError:
+        return True
+    return False
+
+def UvVertsForLine(mesh, edgeVerts):
+    #with no face selected edgeVerts are all selected loops of the selected faces
+    return UvVerts(mesh.uv, mesh.loopVert, edgeVerts)
+
+def DeselectFaces(mesh, faces):
+    for f in faces:
+        mesh.loopSelect[FaceLoops(mesh, f)] = False
+
+def FaceLoopsSelected(mesh):
+    #True for the faces whose loops are all selected
+    if len(mesh.faceStart) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.logical_and.reduceat(mesh.loopSelect, mesh.faceStart)
+
+def ConnectedComponents(count, a, b):
+    """Component index of each of count elements joined by the pairs (a[i], b[i]).
+
+    Union-find working on all pairs at once: roots are hooked onto the smaller
+    root and paths are compressed by pointer jumping until nothing changes.
+    """
+    parent = np.arange(count)
+    while True:
+        rootA = parent[a]
+        rootB = parent[b]
+        hooked = rootA != rootB
+        if not hooked.any():
+            break
+        lo = np.minimum(rootA, rootB)[hooked]
+        hi = np.maximum(rootA, rootB)[hooked]
+        np.minimum.at(parent, hi, lo)
+        while True:
+            grandParent = parent[parent]
+            if (grandParent == parent).all():
+                break
+            parent = grandParent
+
+    roots, ids = np.unique(parent, return_inverse=True)
+    return ids
+
+def IslandIds(mesh, faceMask):
+    #island index of every face in faceMask, -1 for the other faces
+    faceMask = np.asarray(faceMask, dtype=bool)
+    order = mesh.edgeLoops
+    loopEdge = mesh.loopEdge[order]
+    loopFace = mesh.loopFace[order]
+
+    #consecutive loops of the same edge, both faces selected and no seam
+    pair = loopEdge[1:] == loopEdge[:-1]
+    pair &= faceMask[loopFace[1:]] & faceMask[loopFace[:-1]]
+    pair &= ~mesh.edgeSeam[loopEdge[1:]]
+
+    faces = np.flatnonzero(faceMask)
+    index = np.full(len(faceMask), -1, dtype=np.int64)
+    index[faces] = np.arange(len(faces))
+
+    ids = np.full(len(faceMask), -1, dtype=np.int64)
+    ids[faces] = ConnectedComponents(len(faces), index[loopFace[1:][pair]], index[loopFace[:-1][pair]])
+    return ids
+
+def EdgeRingLengths(mesh, faces):
+    """Average 3d length of the edge ring through every edge of the quads in faces.
+
+    Rings are followed through opposite edges of those quads only. The result is
+    indexed by edge, edges outside of faces are nan.
+    """
+    faces = np.fromiter(faces, dtype=np.int64)
+    quads = faces[mesh.faceTotal[faces] == 4]
+    quadEdges = mesh.loopEdge[mesh.faceStart[quads][:, None] + np.arange(4)]
+
+    edges, quadEdges = np.unique(quadEdges, return_inverse=True)
+    quadEdges = quadEdges.reshape(-1, 4)
+    a = np.concatenate((quadEdges[:, 0], quadEdges[:, 1]))
+    b = np.concatenate((quadEdges[:, 2], quadEdges[:, 3]))
+    rings = ConnectedComponents(len(edges), a, b)
+
+    co = mesh.vertCo[mesh.edgeVerts[edges]]
+    lengths = np.linalg.norm(co[:, 0] - co[:, 1], axis=1)
+    ringLengths = np.bincount(rings, weights=lengths) / np.bincount(rings)
+
+    edgeLengths = np.full(len(mesh.edgeVerts), np.nan)
+    edgeLengths[edges] = ringLengths[rings]
+    return edgeLengths
+
+def IslandsFromSelectedFaces(mesh, selectedFaces):
+    faceMask = np.zeros(len(mesh.faceStart), dtype=bool)
+    faceMask[selectedFaces] = True
+    #only faces with all loops selected belong to an island
+    faceMask &= mesh.faceSelect & FaceLoopsSelected(mesh)
+    if not faceMask.any():
+        return []
+
+    ids = IslandIds(mesh, faceMask)
+    faces = np.flatnonzero(faceMask)
+    faces = faces[np.argsort(ids[faces], kind='stable')]
+    bounds = np.flatnonzero(np.diff(ids[faces])) + 1
+    return [set(island.tolist()) for island in np.split(faces, bounds)]
+
+def ShapeFace(mesh, targetFace, uvVerts, cursors, square, ratio = 1.0):
+    corners = list(FaceLoops(mesh, targetFace))
+
+    if len(corners) != 4:
+        return
+
+    lucv, ldcv, rucv, rdcv = Corners(mesh.uv, corners)
+
+    cct = ClosestTo(mesh.uv, [lucv, ldcv, rdcv, rucv], cursors)
+    MakeUvFaceEqualRectangle(mesh.uv, uvVerts, lucv, rucv, rdcv, ldcv, cct, square, ratio)
+    return
+
+def MakeUvFaceEqualRectangle(uv, uvVerts, lucv, rucv, rdcv, ldcv, startv, square = False, ratio = 1.0):
+    if startv is None: startv = lucv
+    elif AreVertsQuasiEqual(uv, startv, rucv): startv = rucv
+    elif AreVertsQuasiEqual(uv, startv, rdcv): startv = rdcv
+    elif AreVertsQuasiEqual(uv, startv, ldcv): startv = ldcv
+    else: startv = lucv
+
+    lu = tuple(uv[lucv])
+    ru = tuple(uv[rucv])
+    rd = tuple(uv[rdcv])
+    ld = tuple(uv[ldcv])
+
+    if (startv == lucv):
+        finalScaleX = hypotVert(lu, ru)
+        finalScaleY = hypotVert(lu, ld)
+        currRowX = lu[0]
+        currRowY = lu[1]
+
+    elif (startv == rucv):
+        finalScaleX = hypotVert(ru, lu)
+        finalScaleY = hypotVert(ru, rd)
+        currRowX = ru[0] - finalScaleX
+        currRowY = ru[1]
+
+    elif (startv == rdcv):
+        finalScaleX = hypotVert(rd, ld)
+        finalScaleY = hypotVert(rd, ru)
+        currRowX = rd[0] - finalScaleX
+        currRowY = rd[1] + finalScaleY
+
+    else:
+        finalScaleX = hypotVert(ld, rd)
+        finalScaleY = hypotVert(ld, lu)
+        currRowX = ld[0]
+        currRowY = ld[1] +finalScaleY
+
+    if square: finalScaleY = finalScaleX*ratio
+    #lucv, rucv
+    uvVerts.move(uv, lucv, (currRowX, currRowY))
+    uvVerts.move(uv, rucv, (currRowX + finalScaleX, currRowY))
+
+    #rdcv, ldcv
+    uvVerts.move(uv, rdcv, (currRowX + finalScaleX, currRowY - finalScaleY))
+    uvVerts.move(uv, ldcv, (currRowX, currRowY - finalScaleY))
+
+    return
+
+def hypotVert(v1, v2):
+    hyp = hypot(v1[0] - v2[0], v1[1] - v2[1])
+    return hyp
+
+def Corners(uv, corners):
+    corners = list(corners)
+    firstHighest = corners[0]
+    for c in corners:
+        if uv[c, 1] > uv[firstHighest, 1]:
+            firstHighest = c
+    corners.remove(firstHighest)
+
+    secondHighest = corners[0]
+    for c in corners:
+        if (uv[c, 1] > uv[secondHighest, 1]):
+            secondHighest = c
+
+    if uv[firstHighest, 0] < uv[secondHighest, 0]:
+        leftUp = firstHighest
+        rightUp = secondHighest
+    else:
+        leftUp = secondHighest
+        rightUp = firstHighest
+    corners.remove(secondHighest)
+
+    firstLowest = corners[0]
+    secondLowest = corners[1]
+
+    if uv[firstLowest, 0] < uv[secondLowest, 0]:
+        leftDown = firstLowest
+        rightDown = secondLowest
+    else:
+        leftDown = secondLowest
+        rightDown = firstLowest
+
+    return leftUp, leftDown, rightUp, rightDown
+
+class UvKDTree:
+    """Closest of a set of loops to 2d points, for selections asked many times.
+
+    The first query scans all points, the tree is only built when it is asked again.
+    Uses mathutils.kdtree in Blender and a NumPy kd-tree with small leaves elsewhere.
+    """
+    leafSize = 16
+
+    def __init__(self, uv, verts, useMathutils = True):
+        self.verts = np.asarray(verts, dtype=np.int64)
+        self.points = uv[self.verts]
+        self.useMathutils = useMathutils
+        self.queries = 0
+        self.tree = None
+        self.nodes = None
+
+    def build(self):
+        if KDTree is not None and self.useMathutils:
+            self.tree = KDTree(len(self.points))
+            for i, (x, y) in enumerate(self.points.tolist()):
+                self.tree.insert((x, y, 0.0), i)
+            self.tree.balance()
+        else:
+            self.order = np.arange(len(self.points))
+            self.nodes = []
+            if len(self.points): self.buildNode(0, len(self.points))
+
+    def buildNode(self, lo, hi):
+        #node is (lo, hi, axis, split, left, right), leaves have axis -1
+        node = len(self.nodes)
+        self.nodes.append((lo, hi, -1, 0.0, -1, -1))
+        if hi - lo <= self.leafSize:
+            return node
+
+        part = self.points[self.order[lo:hi]]
+        axis = int(np.argmax(part.max(axis=0) - part.min(axis=0)))
+        mid = (lo + hi)//2
+        self.order[lo:hi] = self.order[lo:hi][np.argpartition(part[:, axis], mid - lo)]
+        split = float(self.points[self.order[mid], axis])
+        left = self.buildNode(lo, mid)
+        right = self.buildNode(mid, hi)
+        self.nodes[node] = (lo, hi, axis, split, left, right)
+        return node
+
+    def find(self, x, y):
+        #index into verts of the closest point and its distance
+        if len(self.verts) == 0:
+            return None, float('inf')
+        if self.tree is None and self.nodes is None:
+            self.build()
+        if self.tree is not None:
+            co, index, distance = self.tree.find((x, y, 0.0))
+            return index, distance
+
+        best = [float('inf'), -1]
+        def search(node):
+            lo, hi, axis, split, left, right = self.nodes[node]
+            if axis < 0:
+                indices = self.order[lo:hi]
+                delta = self.points[indices] - (x, y)
+                distance = np.hypot(delta[:, 0], delta[:, 1])
+                k = int(np.argmin(distance))
+                if distance[k] < best[0] or (distance[k] == best[0] and indices[k] < best[1]):
+                    best[:] = [float(distance[k]), int(indices[k])]
+                return
+            diff = (x, y)[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            search(near)
+            if abs(diff) <= best[0]: search(far)
+        search(0)
+        return best[1], best[0]
+
+    def closest(self, points):
+        #loop closest to any of points, None without points
+        self.queries += 1
+        if self.queries == 1 and len(self.verts) and len(points):
+            #one pass over the points is cheaper than building the tree for a single query
+            delta = self.points[:, None, :] - np.asarray(points, dtype=np.float64)[None, :, :]
+            distance = np.hypot(delta[..., 0], delta[..., 1]).min(axis=1)
+            return int(self.verts[int(np.argmin(distance))])
+
+        best = None
+        minDistance = float('inf')
+        for x, y in points:
+            index, distance = self.find(x, y)
+            if index is not None and distance < minDistance:
+                minDistance = distance
+                best = int(self.verts[index])
+        return best
+
+def ClosestTo(uv, verts, points, tree = None):
+    #first of verts closest to any of points, tree is an UvKDTree of verts
+    if tree is not None and len(points):
+        closest = tree.closest(points)
+        if closest is not None: return closest
+
+    candidates = [v for v in verts if v is not None]
+    if len(candidates) == 0 or len(points) == 0:
+        return verts[0]
+    delta = uv[candidates][:, None, :] - np.asarray(points, dtype=np.float64)[None, :, :]
+    distance = np.hypot(delta[..., 0], delta[..., 1]).min(axis=1)
+    return candidates[int(np.argmin(distance))]
+
+def AreVectsLinedOnAxis(uv, verts):
+    areLinedX = True
+    areLinedY = True
+    allowedError = 0.00001
+    valX = uv[verts[0], 0]
+    valY = uv[verts[0], 1]
+    for v in verts:
+        if abs(valX - uv[v, 0]) > allowedError:
+            areLinedX = False
+        if abs(valY - uv[v, 1]) > allowedError:
+            areLinedY = False
+    return areLinedX or areLinedY
+
+def IsLineHorizontal(uv, verts):
+    first = verts[0]
+    last = verts[len(verts)-1]
+
+    if ((uv[last, 0] - uv[first, 0]) >0.00001):
+        slope = (uv[last, 1] - uv[first, 1])/(uv[last, 0] - uv[first, 0])
+        if (slope > 1) or (slope <-1):
+            return False
+        return True
+    return False
+
+def MakeEqualDistanceBetweenVertsInLine(uv, filteredVerts, uvVerts, startv = None):
+    verts = filteredVerts
+    verts.sort(key=lambda v: uv[v, 0])      #sort by .x
+
+    horizontal = IsLineHorizontal(uv, verts)
+
+    if horizontal is False:
+        verts.sort(key=lambda v: uv[v, 1])  #sort by .y
+        verts.reverse()     #reverse because y values drop from up to down
+
+    first = uv[verts[0]]
+    last = uv[verts[len(verts)-1]]
+
+    # we have to call length here because if it is not Hor first and second can not actually be first and second
+    length = hypot(first[0] - last[0], first[1] - last[1])
+
+    if startv == verts[len(verts)-1]:
+        if horizontal is True:
+            currentX = last[0] - length
+            currentY = last[1]
+        else:
+            currentX = last[0]
+            currentY = last[1] + length
+    else:
+        currentX = first[0]
+        currentY = first[1]
+
+    numberOfVerts = len(verts)
+    finalScale = length / (numberOfVerts-1)
+
+    for v in verts:
+        uvVerts.move(uv, v, (currentX, currentY))
+
+        if horizontal is True: currentX = currentX + finalScale
+        else: currentY = currentY - finalScale
+    return
+
+def ScaleTo0Axis(uv, filteredVerts, startv = None, horizontal = None):
+    verts = filteredVerts
+    verts.sort(key=lambda v: uv[v, 0])      #sort by .x
+
+    if horizontal is None:
+        horizontal = IsLineHorizontal(uv, verts)
+
+    if horizontal is True:
+        if startv is None:
+            startv = verts[0]
+        #scale to 0 on Y
+        return 'Y', startv
+
+    verts.sort(key=lambda v: uv[v, 1])  #sort by .y
+    verts.reverse()     #reverse because y values drop from up to down
+    if startv is None:
+        startv = verts[0]
+    #scale to 0 on X
+    return 'X', startv
+
+def ScaleTo0(mesh, uvVerts, axis, startv):
+    #same as scaling the selection to 0 on axis around a cursor at startv
+    loops = uvVerts.loops[mesh.faceSelect[mesh.loopFace[uvVerts.loops]]]
+    column = 1 if axis == 'Y' else 0
+    mesh.uv[loops, column] = mesh.uv[startv, column]
+
+def ScaleTo0OnAxisAndCursor(mesh, filteredVerts, uvVerts, editor, startv = None, horizontal = None):
+    axis, startv = ScaleTo0Axis(mesh.uv, filteredVerts, startv, horizontal)
+
+    editor.setCursors(*mesh.uv[startv])
+    ScaleTo0(mesh, uvVerts, axis, startv)
+
+def SnapCursorToClosestSelected(mesh, tree, editor):
+    #snap to the selected vert closest to any 2d cursor, without a cursor to the first one
+    closest = tree.closest(editor.cursors)
+    if closest is None: closest = int(tree.verts[0])
+    editor.setCursors(*mesh.uv[closest])
+
+def ConnectEdgeVerts(mesh, edgeVerts, uvVerts):
+    #edge has ripped so we connect it back
+    edgeVerts = np.asarray(edgeVerts, dtype=np.int64)
+    groups = uvVerts.find(mesh.uv, mesh.loopVert, edgeVerts)
+    connected = edgeVerts[groups >= 0]
+    mesh.uv[connected] = mesh.uv[uvVerts.groupLoops[uvVerts.groupStart[groups[groups >= 0]]]]
+    mesh.loopSelect[connected] = True
+
+def RelaxNonQuads(mesh, nonQuadFaces, before, uvVerts, tolerance = 1e-10):
+    """Carry the uvs of selected non quads along with the quads reshaped around them.
+
+    before holds the uvs from before the reshape and uvVerts the groups of the reshaped
+    quads. UV verts shared with those quads take their new place, the ones shared with
+    faces outside of the selection stay. Every other vert moves by the average move of
+    its neighbours, so the non quads are stretched between the pinned verts instead of
+    being torn off. That is one linear system for all of them, see SolveMoves.
+    """
+    loops = FacesLoops(mesh, nonQuadFaces)
+    if len(loops) == 0: return
+    verts = UvVerts(before, mesh.loopVert, loops)
+    first = verts.groupLoops[verts.groupStart[:-1]]
+
+    quadGroups = uvVerts.find(before, mesh.loopVert, first)
+    pinned = quadGroups >= 0
+    pinnedUv = np.zeros((len(verts), 2))
+    pinnedUv[pinned] = mesh.uv[uvVerts.groupLoops[uvVerts.groupStart[quadGroups[pinned]]]]
+
+    #loops of faces outside of the selection around the same verts
+    inside = np.zeros(len(mesh.faceStart), dtype=bool)
+    inside[np.asarray(nonQuadFaces, dtype=np.int64)] = True
+    outside = np.flatnonzero(np.isin(mesh.loopVert, mesh.loopVert[loops]))
+    outside = outside[~inside[mesh.loopFace[outside]] & (uvVerts.loopGroup[outside] < 0)]
+    stays = np.zeros(len(verts), dtype=bool)
+    found = verts.find(before, mesh.loopVert, outside)
+    stays[found[found >= 0]] = True
+    stays &= ~pinned
+    pinnedUv[stays] = before[first[stays]]
+    pinned |= stays
+
+    #edges of the non quads, both ways
+    a = verts.loopGroup[loops]
+    b = verts.loopGroup[mesh.loopNext[loops]]
+    a, b = np.concatenate((a, b)), np.concatenate((b, a))
+    count = np.bincount(a, minlength=len(verts))
+    free = ~pinned & (count > 0)
+
+    move = np.zeros((len(verts), 2))
+    move[pinned] = pinnedUv[pinned] - before[first[pinned]]
+    move[free] = SolveMoves(a, b, count, free, move, tolerance)
+
+    uv = before[first] + move
+    uv[pinned] = pinnedUv[pinned]
+    mesh.uv[loops] = uv[verts.loopGroup[loops]]
+    mesh.loopSelect[loops] = True
+
+def SolveMoves(a, b, count, free, move, tolerance = 1e-10):
+    """Moves of the free verts that are the average move of their neighbours, a and b being edges both ways.
+
+    That is count*x - (sum of free neighbours' x) = sum of the other neighbours' move, a
+    symmetric system solved by conjugate gradients preconditioned with count, until the
+    residual is tolerance of where it started. It takes at most about one step per free vert.
+    """
+    n = int(free.sum())
+    index = np.full(len(free), -1, dtype=np.int64)
+    index[free] = np.arange(n)
+    freeEdge = free[a] & free[b]
+    fa, fb = index[a[freeEdge]], index[b[freeEdge]]
+    fixed = free[a] & ~free[b]
+    diagonal = count[free].astype(np.float64)[:, None]
+
+    def Apply(x):
+        return diagonal*x - np.stack([np.bincount(fa, weights=x[fb, k], minlength=n) for k in (0, 1)], axis=1)
+
+    rhs = np.stack([np.bincount(index[a[fixed]], weights=move[b[fixed], k], minlength=n) for k in (0, 1)], axis=1)
+    x = np.zeros((n, 2))
+    r = rhs.copy()
+    goal = tolerance*np.linalg.norm(rhs, axis=0)
+    z = r/diagonal
+    p = z.copy()
+    rz = (r*z).sum(axis=0)
+    for step in range(n + 100):
+        if (np.linalg.norm(r, axis=0) <= goal).all(): break
+        q = Apply(p)
+        pq = (p*q).sum(axis=0)
+        #a column that is solved has nothing left to step along
+        alpha = np.divide(rz, pq, out=np.zeros(2), where=pq != 0)
+        x += alpha*p
+        r -= alpha*q
+        z = r/diagonal
+        rzNext = (r*z).sum(axis=0)
+        beta = np.divide(rzNext, rz, out=np.zeros(2), where=rz != 0)
+        p = z + beta*p
+        rz = rzNext
+    return x
+
+def PairsWithin(uv, queries, points, radius):
+    """(query, point, distance) of all points closer than radius to each query, query being an index into queries.
+
+    Points are sorted into cells as big as the radius, every query looks into the 3x3 cells around its own.
+    """
+    queryCells = np.floor(uv[queries]/radius).astype(np.int64)
+    pointCells = np.floor(uv[points]/radius).astype(np.int64)
+    if len(points) == 0 or len(queries) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    lo = pointCells.min(axis=0) - 1
+    height = pointCells[:, 1].max() - lo[1] + 2
+    pointKeys = (pointCells[:, 0] - lo[0])*height + pointCells[:, 1] - lo[1]
+    order = np.argsort(pointKeys, kind='stable')
+    pointKeys = pointKeys[order]
+
+    pairQuery = []
+    pairPoint = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            cellX = queryCells[:, 0] + dx - lo[0]
+            cellY = queryCells[:, 1] + dy - lo[1]
+            keys = np.where((cellY >= 0) & (cellY < height), cellX*height + cellY, -1)
+            start = np.searchsorted(pointKeys, keys, 'left')
+            count = np.searchsorted(pointKeys, keys, 'right') - start
+            query = np.repeat(np.arange(len(queries)), count)
+            within = np.arange(len(query)) - np.repeat(np.cumsum(count) - count, count)
+            pairQuery.append(query)
+            pairPoint.append(order[np.repeat(start, count) + within])
+    pairQuery = np.concatenate(pairQuery)
+    pairPoint = np.asarray(points)[np.concatenate(pairPoint)]
+
+    delta = uv[pairPoint] - uv[np.asarray(queries)[pairQuery]]
+    distance = np.hypot(delta[:, 0], delta[:, 1])
+    close = distance < radius
+    return pairQuery[close], pairPoint[close], distance[close]
+
+def ScanPassed(query, point, distance):
+    """Pairs a scan of every query's points in loop order takes for the closest one, as a mask.
+
+    Pairs are sorted by query and point. Each passed point is as close as or closer than the
+    ones before it. Distances are turned into ranks, so the running minimum is exact.
+    """
+    if len(query) == 0: return np.zeros(0, dtype=bool)
+    rank = np.unique(distance, return_inverse=True)[1].ravel()
+    #every query starts below all queries before it, so the minimum runs within one query
+    value = rank - query*(len(rank) + 1)
+    return value == np.minimum.accumulate(value)
+
+def RipUvFaces(mesh):
+    """Rip selected faces from the rest of the UV map, or a single vertex when no face is selected."""
+    loopSelect = mesh.loopSelect
+    facesSelected = FaceLoopsSelected(mesh)
+
+    if not facesSelected.any():
+        #rip vertex, only the first selected loop stays selected
+        selected = np.flatnonzero(loopSelect)
+        if len(selected):
+            loopSelect[:] = False
+            loopSelect[selected[0]] = True
+    else:
+        #loops shown in the editor keep their selection only if their whole face is selected
+        visible = mesh.faceSelect[mesh.loopFace]
+        loopSelect[:] = np.where(visible, facesSelected[mesh.loopFace], loopSelect)
+    return
+
+defaultJoinRadius = 0.002
+
+def EvenSample(items, count):
+    #at most count evenly spaced items, the step is rounded up so it never leaves more
+    return items[::max(1, -(-len(items) // count))]
+
+def JoinRadius(mesh, loops, fraction = 0.25, sampleCount = 4096):
+    """Join radius as a fraction of the median UV length of the edges starting at loops.
+
+    At most sampleCount evenly spaced loops are measured. A quarter of a typical edge
+    closes gaps left by a rip or a small move but never reaches the other end of an edge.
+    """
+    uv = mesh.uv
+    sample = EvenSample(loops, sampleCount)
+    d = uv[mesh.loopNext[sample]] - uv[sample]
+    lengths = np.hypot(d[:, 0], d[:, 1])
+    lengths = lengths[lengths > 0]
+
+    if len(lengths) == 0: return defaultJoinRadius
+    return fraction * float(np.median(lengths))
+
+def JoinUvFaces(mesh, radius = None):
+    """Snap every selected UV vertex to the closest unselected one within radius.
+
+    Without a radius it comes from JoinRadius over the selected loops.
+    """
+    uv = mesh.uv
+    selected = np.flatnonzero(mesh.loopSelect)
+    uvVerts = UvVerts(uv, mesh.loopVert, selected)
+    if radius is None:
+        radius = JoinRadius(mesh, selected)
+    #no vertex is closer than 0, and the cells below can't be 0 wide
+    if radius <= 0: return radius
+    unselected = np.flatnonzero(~mesh.loopSelect)
+
+    #verts in the order of their first loop, every loop the scan passed over is selected
+    #and no longer joined to, as the addon always did
+    firstLoops = uvVerts.groupLoops[uvVerts.groupStart[:-1]]
+    order = np.argsort(firstLoops, kind='stable')
+    query, point, distance = PairsWithin(uv, firstLoops[order], unselected, radius)
+    pairs = np.lexsort((point, query))
+    query, point, distance = query[pairs], point[pairs], distance[pairs]
+
+    #a loop close to one vert only is never taken away from it, those verts are scanned at once
+    shared = np.bincount(point, minlength=len(uv))[point] > 1
+    contested = np.zeros(len(order), dtype=bool)
+    contested[query[shared]] = True
+    alone = ~contested[query]
+    passed = np.zeros(len(query), dtype=bool)
+    passed[alone] = ScanPassed(query[alone], point[alone], distance[alone])
+
+    #the others one after the other, a loop taken by one of them is no longer a candidate
+    taken = set()
+    bounds = np.searchsorted(query, np.arange(len(order) + 1))
+    for q in np.flatnonzero(contested).tolist():
+        min = radius
+        for i in range(bounds[q], bounds[q + 1]):
+            v = int(point[i])
+            if distance[i] <= min and v not in taken:
+                min = distance[i]
+                passed[i] = True
+        taken.update(point[bounds[q]:bounds[q + 1]][passed[bounds[q]:bounds[q + 1]]].tolist())
+
+    #the last passed loop of a vert is its closest, unselected uvs don't move meanwhile
+    last = np.flatnonzero(passed)
+    isLast = np.ones(len(last), dtype=bool)
+    isLast[:-1] = query[last][1:] != query[last][:-1]
+    last = last[isLast]
+    targets = np.full(len(uvVerts), -1, dtype=np.int64)
+    targets[order[query[last]]] = point[last]
+    targets = np.repeat(targets, np.diff(uvVerts.groupStart))
+    joined = targets >= 0
+    uv[uvVerts.groupLoops[joined]] = uv[targets[joined]]
+    mesh.loopSelect[point[passed]] = True
+    return radius
+
+#modified ideasman42's uvcalc_follow_active.py
+def FollowActiveUV(mesh, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE', edgeLengths = None):
+    uv = mesh.uv
+    loopNext = mesh.loopNext
+    loopRadial = mesh.loopRadial
+    loopEdge = mesh.loopEdge
+    loopFace = mesh.loopFace
+    loopVert = mesh.loopVert
+    edgeManifold = mesh.edgeManifold
+    edgeSeam = mesh.edgeSeam
+    unvisited = set()
+
+    # our own local walker, it only ever touches faces of the island
+    def walk_face_init(faces, f_act):
+        # faces left to uvmap, everything else counts as visited
+        unvisited.update(faces)
+        # the active face is where we begin
+        unvisited.discard(f_act)
+
+    def walk_face(f):
+        unvisited.discard(f)
+        faces_a = [f]
+        faces_b = []
+
+        while faces_a:
+            for f in faces_a:
+                for l in FaceLoops(mesh, f):
+                    l_edge = loopEdge[l]
+                    if edgeManifold[l_edge] and not edgeSeam[l_edge]:
+                        l_other = loopRadial[l]
+                        f_other = loopFace[l_other]
+                        if f_other in unvisited:
+                            yield (f, l, f_other)
+                            unvisited.remove(f_other)
+                            faces_b.append(f_other)
+            # swap
+            faces_a, faces_b = faces_b, faces_a
+            faces_b.clear()
+
+    def extrapolate_uv(fac,
+                       l_a_outer, l_a_inner,
+                       l_b_outer, l_b_inner):
+        uv[l_b_inner] = uv[l_a_inner]
+        uv[l_b_outer] = uv[l_a_inner] + ((uv[l_a_inner] - uv[l_a_outer]) * fac)
+
+    def apply_uv(f_prev, l_prev, f_next):
+        l_a = [None, None, None, None]
+        l_b = [None, None, None, None]
+
+        l_a[0] = l_prev
+        l_a[1] = loopNext[l_a[0]]
+        l_a[2] = loopNext[l_a[1]]
+        l_a[3] = loopNext[l_a[2]]
+
+        #  l_b
+        #  +-----------+
+        #  |(3)        |(2)
+        #  |           |
+        #  |l_next(0)  |(1)
+        #  +-----------+
+        #        ^
+        #  l_a   |
+        #  +-----------+
+        #  |l_prev(0)  |(1)
+        #  |    (f)    |
+        #  |(3)        |(2)
+        #  +-----------+
+        #  copy from this face to the one above.
+
+        # get the other loops
+        l_next = loopRadial[l_prev]
+        if loopVert[l_next] != loopVert[l_prev]:
+            l_b[1] = l_next
+            l_b[0] = loopNext[l_b[1]]
+            l_b[3] = loopNext[l_b[0]]
+            l_b[2] = loopNext[l_b[3]]
+        else:
+            l_b[0] = l_next
+            l_b[1] = loopNext[l_b[0]]
+            l_b[2] = loopNext[l_b[1]]
+            l_b[3] = loopNext[l_b[2]]
+
+        if EXTEND_MODE == 'LENGTH_AVERAGE':
+            try:
+                fac = float(edgeLengths[loopEdge[l_b[2]]]) / float(edgeLengths[loopEdge[l_a[1]]])
+            except ZeroDivisionError:
+                fac = 1.0
+        elif EXTEND_MODE == 'LENGTH':
+            co = mesh.vertCo
+            a0, b0, c0 = co[loopVert[l_a[3]]], co[loopVert[l_a[0]]], co[loopVert[l_b[3]]]
+            a1, b1, c1 = co[loopVert[l_a[2]]], co[loopVert[l_a[1]]], co[loopVert[l_b[2]]]
+
+            d1 = np.linalg.norm(a0 - b0) + np.linalg.norm(a1 - b1)
+            d2 = np.linalg.norm(b0 - c0) + np.linalg.norm(b1 - c1)
+            try:
+                fac = float(d2) / float(d1)
+            except ZeroDivisionError:
+                fac = 1.0
+        else:
+            fac = 1.0
+
+        extrapolate_uv(fac,
+                       l_a[3], l_a[0],
+                       l_b[3], l_b[0])
+
+        extrapolate_uv(fac,
+                       l_a[2], l_a[1],
+                       l_b[2], l_b[1])
+
+    if EXTEND_MODE == 'LENGTH_AVERAGE' and edgeLengths is None:
+        edgeLengths = EdgeRingLengths(mesh, faces)
+
+    walk_face_init(faces, f_act)
+    for f_triple in walk_face(f_act):
+        apply_uv(*f_triple)
+
+def LatticeCoordinates(mesh, f_act, faces):
+    """Integer (i, j) of every loop of the quads FollowActiveUV would reach from f_act.
+
+    The faces are reached in one breadth first pass, a whole front at a time. Returns
+    the coordinates and the reached faces, or None when the quads don't fit on one lattice.
+    """
+    faceStart = mesh.faceStart
+    loopNext = mesh.loopNext
+    loopRadial = mesh.loopRadial
+    loopVert = mesh.loopVert
+    loopFace = mesh.loopFace
+    walkable = mesh.edgeManifold & ~mesh.edgeSeam
+
+    inFaces = np.zeros(len(faceStart), dtype=bool)
+    inFaces[np.fromiter(faces, dtype=np.int64)] = True
+    if (mesh.faceTotal[inFaces] != 4).any():
+        return None
+
+    lattice = np.zeros((len(loopVert), 2), dtype=np.int64)
+    reached = np.zeros(len(faceStart), dtype=bool)
+    first = faceStart[f_act]
+    lattice[first:first + 4] = ((0, 0), (1, 0), (1, 1), (0, 1))
+    reached[f_act] = True
+
+    front = np.array([f_act])
+    while len(front):
+        la = (faceStart[front][:, None] + np.arange(4)).ravel()
+        la = la[walkable[mesh.loopEdge[la]]]
+        lb = loopRadial[la]
+        fb = loopFace[lb]
+        new = inFaces[fb] & ~reached[fb]
+        front, index = np.unique(fb[new], return_index=True)
+        la = la[new][index]
+        lb = lb[new][index]
+
+        #corners of b are those of a, or a mirrored over the shared edge
+        a1 = loopNext[la]
+        p = lattice[la]
+        q = lattice[a1]
+        qFar = 2*q - lattice[loopNext[a1]]
+        pFar = 2*p - lattice[loopNext[loopNext[a1]]]
+
+        #the walk measures flipped neighbours by another edge, those are left to it
+        if (loopVert[lb] == loopVert[la]).any():
+            return None
+        b1 = loopNext[lb]
+        b2 = loopNext[b1]
+        lattice[lb] = q
+        lattice[b1] = p
+        lattice[b2] = pFar
+        lattice[loopNext[b2]] = qFar
+        reached[front] = True
+
+    #both sides of every walked edge have to agree
+    loops = FacesLoops(mesh, np.flatnonzero(reached))
+    loops = loops[walkable[mesh.loopEdge[loops]] & reached[loopFace[loopRadial[loops]]]]
+    other = loopRadial[loops]
+    if ((loopVert[other] == loopVert[loops]).any() or
+        (lattice[loops] != lattice[loopNext[other]]).any() or
+        (lattice[loopNext[loops]] != lattice[other]).any()):
+            return None
+    return lattice, reached
+
+def PieceLattice(mesh, f_act, faces, before):
+    """LatticeCoordinates of quads in pieces that only non quads join, all of them on the lattice of f_act.
+
+    Every other piece is turned by quarter turns and moved by whole cells to where the
+    uvs from before put it next to the pieces placed so far. None when a piece needs the
+    face walk, doesn't fit the others or two quads take one cell.
+    """
+    faces = np.fromiter(faces, dtype=np.int64)
+    result = LatticeCoordinates(mesh, f_act, faces)
+    if result is None:
+        return None
+    lattice, reached = result
+    inFaces = np.zeros(len(mesh.faceStart), dtype=bool)
+    inFaces[faces] = True
+    turns = [np.array(t) for t in (((1, 0), (0, 1)), ((0, -1), (1, 0)), ((-1, 0), (0, -1)), ((0, 1), (-1, 0)))]
+
+    left = np.flatnonzero(inFaces & ~reached)
+    while len(left):
+        #lattice coordinates of the placed pieces as an affine map of their uvs from before
+        placed = FacesLoops(mesh, np.flatnonzero(reached))
+        fit = np.linalg.lstsq(np.column_stack((before[placed], np.ones(len(placed)))), lattice[placed], rcond=None)[0]
+
+        result = LatticeCoordinates(mesh, left[0], left)
+        if result is None:
+            return None
+        pieceLattice, pieceReached = result
+        loops = FacesLoops(mesh, np.flatnonzero(pieceReached))
+        estimate = np.column_stack((before[loops], np.ones(len(loops)))) @ fit
+
+        best = None
+        for turn in turns:
+            turned = pieceLattice[loops] @ turn.T
+            turned += np.round(np.median(estimate - turned, axis=0)).astype(np.int64)
+            error = np.abs(turned - estimate).mean()
+            if best is None or error < best[0]: best = (error, turned)
+        if best[0] >= 0.5:
+            return None
+        lattice[loops] = best[1]
+        reached |= pieceReached
+        left = np.flatnonzero(inFaces & ~reached)
+
+    corners = lattice[FacesLoops(mesh, faces)].reshape(-1, 4, 2).min(axis=1)
+    if len(np.unique(corners, axis=0)) != len(faces):
+        return None
+    return lattice, reached
+
+def LineLengths(mesh, lattice, loops):
+    #average 3d length of the edges on every lattice line, the edge rings of pieces are cut apart by non quads
+    edgeLengths = np.full(len(mesh.edgeVerts), np.nan)
+    nextLoops = mesh.loopNext[loops]
+    delta = lattice[nextLoops] - lattice[loops]
+    for axis in (0, 1):
+        along = (np.abs(delta[:, axis]) == 1) & (delta[:, 1 - axis] == 0)
+        edges, first = np.unique(mesh.loopEdge[loops[along]], return_index=True)
+        lines = np.minimum(lattice[loops, axis], lattice[nextLoops, axis])[along][first]
+        co = mesh.vertCo[mesh.edgeVerts[edges]]
+        lengths = np.linalg.norm(co[:, 0] - co[:, 1], axis=1)
+        lines, line = np.unique(lines, return_inverse=True)
+        edgeLengths[edges] = (np.bincount(line, weights=lengths) / np.bincount(line))[line]
+    return edgeLengths
+
+def LatticeSteps(mesh, lattice, loops, axis, edgeLengths):
+    #offset of every lattice line along axis, lines are as far apart as their edge ring is long
+    nextLoops = mesh.loopNext[loops]
+    delta = lattice[nextLoops] - lattice[loops]
+    along = (np.abs(delta[:, axis]) == 1) & (delta[:, 1 - axis] == 0)
+    lines = np.minimum(lattice[loops, axis], lattice[nextLoops, axis])[along]
+    lengths = edgeLengths[mesh.loopEdge[loops[along]]]
+
+    lo = lattice[loops, axis].min()
+    count = lattice[loops, axis].max() - lo
+    widths = np.full(count, np.inf)
+    np.minimum.at(widths, lines - lo, lengths)
+    widest = np.full(count, -np.inf)
+    np.maximum.at(widest, lines - lo, lengths)
+    #only pieces joined by non quads leave lines without edges, those are as wide as the others on average
+    empty = widest == -np.inf
+    if empty.any() and not empty.all():
+        widths[empty] = widest[empty] = widths[~empty].mean()
+    #a line split into rings of different lengths doesn't fit the lattice
+    if not (np.isfinite(widths).all() and (widths == widest).all() and (widths > 0).all()):
+        return None, lo
+
+    offsets = np.concatenate(([0.0], np.cumsum(widths / widths[-lo])))
+    return offsets - offsets[-lo], lo
+
+def LatticeLayout(mesh, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE', edgeLengths = None, before = None):
+    """Loops of the quads reachable from f_act and the lattice offsets (x, y) of each of them.
+
+    Offsets are in sizes of the active quad. None when the faces need the face walk.
+    With the uvs from before, pieces of quads only joined by non quads are placed too,
+    see PieceLattice, and their lines are as long as their edges on average.
+    """
+    if f_act < 0 or mesh.faceTotal[f_act] != 4:
+        return None
+    if before is None: result = LatticeCoordinates(mesh, f_act, faces)
+    else: result = PieceLattice(mesh, f_act, faces, before)
+    if result is None:
+        return None
+    lattice, reached = result
+
+    loops = FacesLoops(mesh, np.flatnonzero(reached))
+    i = lattice[loops, 0]
+    j = lattice[loops, 1]
+    if EXTEND_MODE == 'LENGTH_AVERAGE':
+        if before is not None:
+            edgeLengths = LineLengths(mesh, lattice, loops)
+        elif edgeLengths is None:
+            edgeLengths = EdgeRingLengths(mesh, faces)
+        stepsI, loI = LatticeSteps(mesh, lattice, loops, 0, edgeLengths)
+        stepsJ, loJ = LatticeSteps(mesh, lattice, loops, 1, edgeLengths)
+        if stepsI is None or stepsJ is None:
+            return None
+        return loops, np.stack((stepsI[i - loI], stepsJ[j - loJ]), axis=1)
+    if EXTEND_MODE == 'EVEN':
+        return loops, np.stack((i, j), axis=1).astype(np.float64)
+    return None
+
+def PlaceLattice(mesh, f_act, layout):
+    #every loop gets the uv of its lattice point on the axes of the shaped active quad
+    uv = mesh.uv
+    loops, offsets = layout
+    first = mesh.faceStart[f_act]
+    origin = uv[first].copy()
+    axisI = uv[first + 1] - origin
+    axisJ = uv[first + 3] - origin
+    #the walk only keeps lattice lines straight from a parallelogram
+    if not np.allclose(uv[first + 2], origin + axisI + axisJ, rtol=0, atol=1e-9):
+        return False
+
+    placed = offsets @ np.array((axisI, axisJ))
+    placed += origin
+    uv[loops] = placed
+    return True
+
+def LatticeUV(mesh, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE', edgeLengths = None, before = None):
+    """Same result as FollowActiveUV for quads that fit on one lattice, in one vectorized step.
+
+    Returns False and leaves uvs alone when the faces need the face walk.
+    """
+    layout = LatticeLayout(mesh, f_act, faces, EXTEND_MODE, edgeLengths, before)
+    if layout is None:
+        return False
+    return PlaceLattice(mesh, f_act, layout)
+
+class IslandSolver:
+    """Reshapes one detached island again and again, for other cursors or grid modes.
+
+    The uv index, ring lengths and lattice layouts are found on first use and kept,
+    so a solve is a ShapeFace and one vectorized placement. Islands that need the
+    face walk keep their result per start corner and mode instead.
+    """
+    def __init__(self, island, ratio = 1.0):
+        self.island = island
+        self.ratio = ratio
+        self.uv = island.uv.copy()
+        self.faces = range(len(island.faceStart))
+        self.uvVerts = UvVerts(island.uv, island.loopVert, np.arange(len(island.uv)))
+        self.edgeLengths = None
+        self.layouts = {}
+        self.results = {}
+
+        self.corners = None
+        if island.activeFace >= 0 and island.faceTotal[island.activeFace] == 4:
+            lucv, ldcv, rucv, rdcv = Corners(self.uv, FaceLoops(island, island.activeFace))
+            self.corners = [lucv, ldcv, rdcv, rucv]
+
+    def layout(self, mode):
+        if mode not in self.layouts:
+            if mode == 'LENGTH_AVERAGE' and self.edgeLengths is None:
+                self.edgeLengths = EdgeRingLengths(self.island, self.faces)
+            self.layouts[mode] = LatticeLayout(self.island, self.island.activeFace, self.faces, mode, self.edgeLengths)
+        return self.layouts[mode]
+
+    def startCorner(self, cursors):
+        #loop of the active quad corner ShapeFace starts from
+        if self.corners is None: return None
+        return ClosestTo(self.uv, self.corners, cursors)
+
+    def solve(self, cursors, square = False):
+        #the returned uvs are only valid until the next solve
+        island = self.island
+        key = (self.startCorner(cursors), square)
+        if key in self.results:
+            return self.results[key]
+
+        mode = 'EVEN' if square else 'LENGTH_AVERAGE'
+        island.uv[:] = self.uv
+        ShapeFace(island, island.activeFace, self.uvVerts, cursors, square, self.ratio)
+
+        layout = self.layout(mode)
+        if layout is None or not PlaceLattice(island, island.activeFace, layout):
+            if mode == 'LENGTH_AVERAGE' and self.edgeLengths is None:
+                self.edgeLengths = EdgeRingLengths(island, self.faces)
+            FollowActiveUV(island, island.activeFace, self.faces, mode, self.edgeLengths)
+            #walked results are slow to get again
+            self.results[key] = island.uv.copy()
+            return self.results[key]
+        return island.uv
+
+def DetachFaces(mesh, faces, activeFace = -1):
+    """UvMesh holding only the given faces, and the indices of its loops in mesh.
+
+    Loops, edges and verts are renumbered so the copy is as small as the faces.
+    """
+    faces = np.sort(np.fromiter(faces, dtype=np.int64))
+    faceTotal = mesh.faceTotal[faces]
+    faceStart = np.concatenate(([0], np.cumsum(faceTotal)[:-1]))
+    loops = FacesLoops(mesh, faces)
+
+    edges, loopEdge = np.unique(mesh.loopEdge[loops], return_inverse=True)
+    verts, edgeVerts = np.unique(mesh.edgeVerts[edges], return_inverse=True)
+    loopVert = np.searchsorted(verts, mesh.loopVert[loops])
+
+    topology = MeshTopology(faceStart, faceTotal, loopVert, loopEdge, edgeVerts.reshape(-1, 2))
+    index = np.searchsorted(faces, activeFace)
+    if index < len(faces) and faces[index] == activeFace: activeFace = int(index)
+    else: activeFace = -1
+
+    detached = UvMesh(mesh.uv[loops], mesh.loopSelect[loops], mesh.faceSelect[faces],
+                      mesh.edgeSeam[edges], mesh.vertCo[verts], topology, activeFace)
+    return detached, loops
+
+def GridIsland(island, square = False, cursors = (), ratio = 1.0, linked = False):
+    #island is a detached UvMesh of one island, its reshaped uvs and the Stages spent on it are returned
+    #linked islands may be pieces of quads joined by non quads
+    stages = Stages()
+    uvVerts = UvVerts(island.uv, island.loopVert, np.arange(len(island.uv)))
+
+    faces = range(len(island.faceStart))
+    #quads of the island joined only by non quads, which are not part of it
+    pieces = IslandIds(island, np.ones(len(faces), dtype=bool)) if linked else np.zeros(len(faces), dtype=np.int64)
+    before = island.uv.copy() if pieces.max() > 0 else None
+    with stages.time("ShapeFace", 1):
+        ShapeFace(island, island.activeFace, uvVerts, cursors, square, ratio)
+    #a single face is done once it is shaped
+    if len(faces) == 1: return island.uv, stages
+
+    mode = 'EVEN' if square else 'LENGTH_AVERAGE'
+    edgeLengths = None
+    if not square and before is None:
+        with stages.time("edge lengths", len(island.edgeVerts)):
+            edgeLengths = EdgeRingLengths(island, faces)
+
+    #islands that don't fit on one lattice are walked face by face
+    with stages.time("grid solve", len(faces)):
+        solved = LatticeUV(island, island.activeFace, faces, mode, edgeLengths, before)
+    if not solved and before is not None:
+        #pieces that don't line up are gridded one by one, each from a start face of its own
+        island.uv[:] = before
+        for piece in range(pieces.max() + 1):
+            pieceFaces = np.flatnonzero(pieces == piece)
+            start = island.activeFace if pieces[island.activeFace] == piece else pieceFaces[0]
+            detached, loops = DetachFaces(island, pieceFaces, start)
+            uv, pieceStages = GridIsland(detached, square, cursors, ratio)
+            island.uv[loops] = uv
+            stages.merge(pieceStages)
+        return island.uv, stages
+    if not solved:
+        with stages.time("face walk", len(faces)):
+            FollowActiveUV(island, island.activeFace, faces, mode, edgeLengths)
+    return island.uv, stages
+
+def DetachIslands(mesh, selFaces, linkFaces = ()):
+    #linkFaces join the quads of selFaces into islands without being part of them
+    islands = IslandsFromSelectedFaces(mesh, list(selFaces) + list(linkFaces))
+    if len(linkFaces):
+        quads = set(selFaces)
+        islands = [island & quads for island in islands if not island.isdisjoint(quads)]
+
+    detached = []
+    for island in islands:
+        targetFace = mesh.activeFace
+        if (targetFace < 0 or
+            targetFace not in island or
+            len(islands) > 1 or
+            mesh.faceSelect[targetFace] == False or
+            mesh.faceTotal[targetFace] != 4):
+                targetFace = next(iter(island))
+
+        detached.append(DetachFaces(mesh, island, targetFace))
+    return detached
+
+def IslandChunkSize(count, workers):
+    #about four tasks per worker, small islands are sent in batches instead of one by one
+    return max(1, -(-count // (4*workers)))
+
+def GridMeshes(selections, cursors, square = False, ratio = 1.0, executorFor = None, stages = None):
+    """Reshape every island of several meshes to grid, selections are (mesh, selFaces, linkFaces).
+
+    linkFaces are selected non quads, the quads they join are one island on one lattice.
+
+    Islands don't share uvs, so each one is reshaped on its own detached copy and the
+    results are copied back at the end. executorFor gets the face count of every
+    island and gives the executor to map them in, or None to reshape them here.
+    """
+    if stages is None: stages = Stages()
+    with stages.time("islands"):
+        jobs = [(mesh, loops, detached, len(linkFaces) > 0)
+                for mesh, selFaces, linkFaces in selections
+                for detached, loops in DetachIslands(mesh, selFaces, linkFaces)]
+    count = len(jobs)
+    stages.add("islands", 0.0, count)
+
+    executor = None
+    if executorFor is not None and count > 1:
+        executor = executorFor([len(detached.faceStart) for mesh, loops, detached, linked in jobs])
+
+    args = ([detached for mesh, loops, detached, linked in jobs], [square]*count, [cursors]*count, [ratio]*count,
+            [linked for mesh, loops, detached, linked in jobs])
+    if executor is None: results = map(GridIsland, *args)
+    else: results = executor.map(GridIsland, *args, chunksize=IslandChunkSize(count, os.cpu_count() or 1))
+
+    for (mesh, loops, detached, linked), (uv, islandStages) in zip(jobs, results):
+        mesh.uv[loops] = uv
+        stages.merge(islandStages)
+    return count
+
+def PrepareMesh(mesh, editor, snapToClosest = False, keepNonQuads = False, stages = None):
+    #lines and single verts are done right away, a selection of faces is returned for Reshape to grid
+    if stages is None: stages = Stages()
+
+    with stages.time("ListsOfVerts"):
+        edgeVerts, filteredVerts, selFaces, nonQuadFaces, uvVerts, noEdge = ListsOfVerts(mesh)
+    stages.add("ListsOfVerts", 0.0, len(filteredVerts))
+
+    if len(filteredVerts) == 0: return
+    if len(filteredVerts) == 1:
+        SnapCursorToClosestSelected(mesh, UvKDTree(mesh.uv, filteredVerts), editor)
+        return
+
+    #line is selected
+
+    if len(selFaces) == 0:
+        #one tree of the selection serves both snapping and aligning
+        tree = UvKDTree(mesh.uv, filteredVerts)
+        if snapToClosest is True:
+            SnapCursorToClosestSelected(mesh, tree, editor)
+            return
+
+        cursorClosestTo = ClosestTo(mesh.uv, filteredVerts, editor.cursors, tree)
+
+        uvVerts = UvVertsForLine(mesh, edgeVerts)
+
+        if AreVectsLinedOnAxis(mesh.uv, filteredVerts) is False:
+            with stages.time("snap to axis", len(filteredVerts)):
+                ScaleTo0OnAxisAndCursor(mesh, filteredVerts, uvVerts, editor, cursorClosestTo)
+            return
+
+        with stages.time("equal distance", len(filteredVerts)):
+            MakeEqualDistanceBetweenVertsInLine(mesh.uv, filteredVerts, uvVerts, cursorClosestTo)
+        return
+
+    if keepNonQuads and len(nonQuadFaces):
+        #non quads follow the grid, their uvs from before it are needed to find where they move
+        return mesh, selFaces, edgeVerts, uvVerts, noEdge, (nonQuadFaces, mesh.uv.copy())
+
+    # deselect non quads
+    DeselectFaces(mesh, nonQuadFaces)
+
+    return mesh, selFaces, edgeVerts, uvVerts, noEdge, None
+
+def Reshape(meshes, editor, square = False, snapToClosest = False, ratio = 1.0, keepNonQuads = False,
+            executorFor = None, stages = None):
+    """Grid, axis and cursor snapping of the UV Squares operators on several meshes.
+
+    editor has the 2d cursors and moves them with setCursors. Meshes are taken one
+    after the other, lines and single verts are done right away and the islands of
+    all meshes are reshaped in one pass at the end. executorFor gives the executor
+    for islands of these face counts, or None to reshape them here.
+    """
+    if stages is None: stages = Stages()
+    grids = []
+    for mesh in meshes:
+        grid = PrepareMesh(mesh, editor, snapToClosest, keepNonQuads, stages)
+        if grid is not None: grids.append(grid)
+    if len(grids) == 0: return
+
+    GridMeshes([(mesh, selFaces, nonQuads[0] if nonQuads is not None else ())
+                for mesh, selFaces, edgeVerts, uvVerts, noEdge, nonQuads in grids],
+               editor.cursors, square, ratio, executorFor, stages)
+
+    for mesh, selFaces, edgeVerts, uvVerts, noEdge, nonQuads in grids:
+        if noEdge is False:
+            #edge has ripped so we connect it back
+            with stages.time("connect edges", len(edgeVerts)):
+                ConnectEdgeVerts(mesh, edgeVerts, uvVerts)
+        if nonQuads is not None:
+            nonQuadFaces, before = nonQuads
+            with stages.time("relax non quads", len(nonQuadFaces)):
+                RelaxNonQuads(mesh, nonQuadFaces, before, uvVerts)
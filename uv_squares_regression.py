@@ -0,0 +1,311 @@
+#    <Uv Squares, Blender addon for reshaping UV vertices to grid.>
+#    Copyright (C) <2020> <Reslav Hollos>
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare the UVs every operator makes on a stored corpus against golden results.
+
+Every case in the regression folder holds a mesh with its UVs, selection and 2d
+cursors, the operator to run with its options, the UVs and selection it gave when
+recorded and what recorded them. Against the pure core, with any Python 3 and NumPy:
+
+    python uv_squares_regression.py
+
+Through the registered operators, in Blender with or without its interface
+(the cases run in an UV Editor, its cursor is at the origin unless the case moves
+it; without a window the cursors are handed over in uv_squares.backgroundCursors):
+
+    blender -b --factory-startup --python uv_squares_regression.py -- --engine blender
+
+The goldens were recorded from uv_squares 1.14.1, the addon as it was before
+uv_squares_core, with nothing changed but its "== not 0" syntax error, so that it
+compiles. Its axis operators need an UV Editor, so it records in Blender 4.2 with
+a window:
+
+    blender --factory-startup --python uv_squares_regression.py -- \\
+        --engine blender --addon <folder of that addon> --update
+
+With several islands that addon started each one at any of its faces, so grid
+cases are recorded island by island from the face the core starts it at. Join
+cases set the fixed radius it always used, cases with options it doesn't have,
+as Keep Non-Quads, are skipped and were recorded from the core with --engine core
+--update. Blender stores UVs as 32 bit floats, results are compared within
+--tolerance. --cases limits the run to some cases.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import uv_squares_core as core
+from uv_squares_benchmark import generators, Selection, MeshData, CoreMesh
+
+corpusDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regression")
+
+#goldens are 32 bit floats made by a Blender, the core works on 64 bit ones
+defaultTolerance = 1e-5
+
+#join as the addon did before the radius was automatic, an addon without these options records the same
+fixedRadius = {"radius_mode": 'FIXED', "radius": 0.002}
+
+#name, mesh kind, face count, operator, selection, 2d cursors, operator options
+cases = (
+    ("grid_small_square", "grid", 64, "uv_squares", "faces", (), {}),
+    ("grid_small_shape_cursor", "grid", 64, "uv_squares_by_shape", "faces", ((1.0, 1.0),), {}),
+    ("cylinder_small_square", "cylinder", 64, "uv_squares", "faces", (), {}),
+    ("cylinder_small_shape", "cylinder", 64, "uv_squares_by_shape", "faces", (), {}),
+    ("atlas_small_shape_cursor", "atlas", 400, "uv_squares_by_shape", "faces", ((0.5, 0.5),), {}),
+    ("scan_small_square", "scan", 100, "uv_squares", "faces", (), {}),
+    ("scan_small_shape_cursor", "scan", 100, "uv_squares_by_shape", "faces", ((0.0, 0.0),), {}),
+    ("scan_small_rip", "scan", 100, "uv_face_rip", "half sticky", (), {}),
+    ("scan_small_rip_vertex", "scan", 100, "uv_face_rip", "vertex", (), {}),
+    ("scan_small_join", "scan", 100, "uv_face_join", "half moved", (), fixedRadius),
+    ("scan_small_axis", "scan", 100, "uv_snap_to_axis", "line", (), {}),
+    ("scan_small_axis_cursor", "scan", 100, "uv_snap_to_axis", "line", ((1.0, 0.0),), {}),
+    ("scan_small_axis_equal", "scan", 100, "uv_snap_to_axis_and_equal", "line", (), {}),
+    ("grid_large_join", "grid", 2500, "uv_face_join", "half moved", (), fixedRadius),
+    ("cylinder_large_square", "cylinder", 2500, "uv_squares", "faces", (), {}),
+    ("atlas_large_shape", "atlas", 2500, "uv_squares_by_shape", "faces", (), {}),
+    ("scan_large_square", "scan", 2500, "uv_squares", "faces", (), {}),
+    ("scan_large_shape_cursor", "scan", 2500, "uv_squares_by_shape", "faces", ((0.0, 0.0),), {}),
+    ("scan_small_square_keep", "scan", 100, "uv_squares", "faces", (), {"keep_non_quads": True}),
+    ("scan_large_shape_keep", "scan", 2500, "uv_squares_by_shape", "faces", (), {"keep_non_quads": True}),
+)
+
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(description="Compare UV Squares results against golden ones.")
+    parser.add_argument("--engine", choices=("core", "blender"), default="core",
+                        help="core: run uv_squares_core directly, blender: run the operators")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="largest allowed UV difference, %g by default" % defaultTolerance)
+    parser.add_argument("--cases", default="", help="comma separated case names, all when empty")
+    parser.add_argument("--update", action="store_true", help="record the results of --engine as golden")
+    parser.add_argument("--addon", default="", help="folder of the uv_squares.py the blender engine runs")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the meshes made by --update")
+    return parser.parse_args(argv)
+
+'''------------------------ corpus ------------------------'''
+
+def CasePath(name):
+    return os.path.join(corpusDir, name + ".npz")
+
+def MakeCase(name, kind, faceCount, operator, selection, cursors, options, seed):
+    #the mesh is made once by the benchmark generators and stored, so later changes to them don't matter
+    rng = np.random.default_rng(seed)
+    data = generators[kind](faceCount, rng)
+    cell = 1.0/len(data.loopTotal)**0.5
+    #every vertex is moved on its own, so the generated grids are no longer already square
+    uv = (data.loopUv + rng.normal(0, 0.1*cell, (len(data.co), 2))[data.loopVert]).astype(np.float32)
+
+    if selection == "faces": loopSelect = Selection("uv_squares", data)
+    elif selection == "line": loopSelect = Selection("uv_snap_to_axis", data)
+    else: loopSelect = Selection("uv_face_rip", data)
+    if selection == "half sticky":
+        #as selected in the editor, loops of the unselected faces around selected verts are selected too
+        loopSelect = np.isin(data.loopVert, data.loopVert[loopSelect])
+    if selection == "vertex":
+        loopSelect = data.loopVert == data.loopVert[np.flatnonzero(loopSelect)[-1]]
+    if selection == "half moved":
+        #a small move that join has to close again, within the radius join used to have
+        uv[loopSelect] += np.float32(0.001)
+
+    return {"operator": np.array(operator), "options": np.array(json.dumps(options)), "co": data.co.astype(np.float32),
+            "loopVert": data.loopVert.astype(np.int32), "loopTotal": data.loopTotal.astype(np.int32),
+            "seams": np.array(data.seams, dtype=np.int32).reshape(-1, 2), "uv": uv,
+            "loopSelect": loopSelect, "faceSelect": np.ones(len(data.loopTotal), dtype=bool),
+            "cursors": np.array(cursors, dtype=np.float64).reshape(-1, 2)}
+
+def CaseCursors(case):
+    #every case runs in one UV Editor, its cursor is at the origin unless the case moves it
+    return [tuple(c) for c in case["cursors"]] or [(0.0, 0.0)]
+
+def CaseMesh(case):
+    #UvMesh as ReadMesh would give it
+    data = MeshData(case["co"], case["loopVert"], case["loopTotal"], case["uv"], case["seams"], [])
+    return CoreMesh(data, case["loopSelect"], case["faceSelect"])
+
+'''------------------------ engines ------------------------'''
+
+class CoreEditor:
+    """Cursors of the UV Editors without Blender, setCursors moves all of them like EditorSnapshot."""
+    def __init__(self, cursors):
+        self.cursors = [tuple(c) for c in cursors]
+
+    def setCursors(self, x, y):
+        self.cursors = [(x, y)]*len(self.cursors)
+
+def RunCore(case):
+    mesh = CaseMesh(case)
+    editor = CoreEditor(CaseCursors(case))
+    operator = str(case["operator"])
+    options = json.loads(str(case["options"]))
+
+    if operator == "uv_face_rip": core.RipUvFaces(mesh)
+    elif operator == "uv_face_join":
+        core.JoinUvFaces(mesh, options["radius"] if options.get("radius_mode") == 'FIXED' else None)
+    else:
+        #the operators run main, Reshape is what main runs on every mesh, for an image of 256x256
+        square = operator == "uv_squares"
+        keepNonQuads = options.get("keep_non_quads", False)
+        for r in range(2 if operator == "uv_snap_to_axis_and_equal" else 1):
+            core.Reshape([mesh], editor, square, keepNonQuads=keepNonQuads)
+    return mesh.uv, mesh.loopSelect
+
+def BlenderAddon():
+    #description of the addon the blender engine runs, kept with the cases it records
+    import bpy
+    import uv_squares
+    return "uv_squares %s from %s in Blender %s" % (".".join(map(str, uv_squares.bl_info["version"])),
+                                                  os.path.basename(os.path.dirname(os.path.abspath(uv_squares.__file__))),
+                                                  bpy.app.version_string)
+
+def OperatorOptions(name, options):
+    #options the registered operator doesn't have, older versions of it, are left out
+    import bpy
+    properties = getattr(bpy.ops.uv, name).get_rna_type().properties.keys()
+    return {k: v for k, v in options.items() if k in properties}
+
+def RunBlender(case, name, override, activeFace = -1):
+    import bpy
+    from uv_squares_benchmark import BuildObject, SetUvSelect, RunOperator
+
+    if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    for obj in list(bpy.context.scene.objects):
+        bpy.data.objects.remove(obj)
+
+    data = MeshData(case["co"], case["loopVert"], case["loopTotal"], case["uv"],
+                    case["seams"].tolist(), None)
+    obj = BuildObject(name, data)
+    me = obj.data
+    me.uv_layers.active.data.foreach_set("uv", case["uv"].astype(np.float32).ravel())
+    SetUvSelect(me.uv_layers.active, case["loopSelect"])
+    me.polygons.foreach_set("select", case["faceSelect"])
+    if activeFace >= 0: me.polygons.active = activeFace
+    bpy.context.view_layer.objects.active = obj
+    obj.select_set(True)
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    operator = str(case["operator"])
+    if "area" in override: override["area"].spaces[0].cursor_location = CaseCursors(case)[0]
+    else:
+        import uv_squares
+        uv_squares.backgroundCursors[:] = CaseCursors(case)
+    RunOperator(override, obj, operator, **OperatorOptions(operator, json.loads(str(case["options"]))))
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    uv = np.empty(len(me.loops)*2, dtype=np.float32)
+    loopSelect = np.empty(len(me.loops), dtype=bool)
+    me.uv_layers.active.data.foreach_get("uv", uv)
+    me.uv_layers.active.data.foreach_get("select", loopSelect)
+    return uv.reshape(-1, 2).astype(np.float64), loopSelect
+
+def RunBlenderByIsland(case, name, override):
+    """Run a grid operator on every selected island on its own, from the face the core starts it at.
+
+    With several islands the addon before the core started each one at any of its
+    faces, on its own an island starts at the active face.
+    """
+    mesh = CaseMesh(case)
+    islands = core.IslandsFromSelectedFaces(mesh, core.ListsOfVerts(mesh)[2])
+    if len(islands) < 2: return RunBlender(case, name, override)
+
+    uv = case["uv"].astype(np.float64)
+    loopSelect = case["loopSelect"].copy()
+    for island in islands:
+        loops = np.isin(mesh.loopFace, list(island))
+        islandUv, islandSelect = RunBlender(dict(case, loopSelect=case["loopSelect"] & loops), name, override,
+                                            next(iter(island)))
+        uv[loops] = islandUv[loops]
+        loopSelect[loops] = islandSelect[loops]
+    return uv, loopSelect
+
+def Override(args):
+    #context of the operators, None when the addon can't run here
+    if args.engine == "core": return {}
+    import bpy
+    if args.addon:
+        sys.path.insert(0, os.path.abspath(args.addon))
+    import uv_squares
+    if not hasattr(bpy.types, "UV_PT_UvSquares"):
+        uv_squares.register()
+    bpy.context.scene.tool_settings.use_uv_select_sync = False
+    if len(bpy.context.window_manager.windows):
+        from uv_squares_benchmark import UvEditor
+        return UvEditor()
+    #without a window the operators take the cursors of the case from backgroundCursors, older addons need an UV Editor
+    if not hasattr(uv_squares, "backgroundCursors"):
+        print("UvSquares regression: this addon needs an UV Editor, run Blender with its interface")
+        return None
+    return {}
+
+'''------------------------ driver ------------------------'''
+
+def Update(args, names):
+    override = Override(args)
+    if override is None: return False
+    recorded = BlenderAddon() if args.engine == "blender" else "uv_squares_core with NumPy " + np.__version__
+
+    os.makedirs(corpusDir, exist_ok=True)
+    for name, kind, faceCount, operator, selection, cursors, options in cases:
+        if name not in names: continue
+        missing = [k for k in options if args.engine == "blender" and k not in OperatorOptions(operator, options)]
+        if any(fixedRadius.get(k) != options[k] for k in missing):
+            print("skipped  %-28s the addon has no %s" % (name, ", ".join(missing)))
+            continue
+        case = MakeCase(name, kind, faceCount, operator, selection, cursors, options, args.seed)
+        if args.engine == "core": case["expectedUv"], case["expectedSelect"] = RunCore(case)
+        elif operator in ("uv_squares", "uv_squares_by_shape"):
+            case["expectedUv"], case["expectedSelect"] = RunBlenderByIsland(case, name, override)
+        else: case["expectedUv"], case["expectedSelect"] = RunBlender(case, name, override)
+        case["recorded"] = np.array(recorded)
+        np.savez_compressed(CasePath(name), **case)
+        print("recorded %-28s %6d loops%s" % (name, len(case["uv"]), ", without " + ", ".join(missing) if missing else ""))
+    return True
+
+def Compare(args, names):
+    tolerance = args.tolerance
+    if tolerance is None: tolerance = defaultTolerance
+    override = Override(args)
+    if override is None: return False
+
+    failed = 0
+    for name in [c[0] for c in cases if c[0] in names]:
+        with np.load(CasePath(name)) as stored:
+            case = dict(stored)
+
+        if args.engine == "core": uv, loopSelect = RunCore(case)
+        else: uv, loopSelect = RunBlender(case, name, override)
+
+        error = float(np.abs(uv - case["expectedUv"]).max()) if len(uv) else 0.0
+        selectDiff = int((loopSelect != case["expectedSelect"]).sum())
+        ok = error <= tolerance and selectDiff == 0
+        failed += not ok
+        print("%-8s %-28s max uv error %.3g, %d selection changes" %
+              ("ok" if ok else "FAILED", name, error, selectDiff))
+
+    print("UvSquares regression finished,", failed, "failed.")
+    return failed == 0
+
+def Regression(args):
+    names = set(n for n in args.cases.split(",") if n) or set(c[0] for c in cases)
+    if args.update: return Update(args, names)
+    return Compare(args, names)
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    sys.exit(0 if Regression(ParseArgs(argv)) else 1)